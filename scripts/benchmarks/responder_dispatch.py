@@ -0,0 +1,46 @@
+"""Per-message responder dispatch overhead: per-call signature inspection vs cached adapters.
+
+Run with `python scripts/benchmarks/responder_dispatch.py`.
+"""
+
+import inspect
+import timeit
+
+from pylogue.core import EchoResponder, _responder_adapter
+
+
+def _legacy_invoke(responder, prompt, context):
+    # Dispatch as it was done before adapters: inspect the signature on every message.
+    try:
+        signature = inspect.signature(responder)
+    except (TypeError, ValueError):
+        signature = None
+    if signature is not None:
+        params = signature.parameters
+        if "context" in params or any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params.values()):
+            return responder(prompt, context=context)
+    try:
+        return responder(prompt)
+    except TypeError:
+        return responder(prompt, context)
+
+
+def sync_responder(message):
+    return message
+
+
+def main(number: int = 50_000):
+    context = {"user": None}
+    for name, responder in (("class (EchoResponder)", EchoResponder()), ("function", sync_responder)):
+        legacy = timeit.timeit(lambda r=responder: _legacy_invoke(r, "hi", context), number=number)
+        adapter = _responder_adapter(responder)
+        cached = timeit.timeit(lambda r=responder, a=adapter: a(r, "hi", context), number=number)
+        lookup = timeit.timeit(lambda r=responder: _responder_adapter(r)(r, "hi", context), number=number)
+        print(f"{name}:")
+        print(f"  signature per message  {legacy / number * 1e6:8.2f} us")
+        print(f"  cached adapter         {cached / number * 1e6:8.2f} us")
+        print(f"  adapter lookup + call  {lookup / number * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
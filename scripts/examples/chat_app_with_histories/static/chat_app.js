@@ -35,6 +35,11 @@ const api = {
     const res = await fetch(`/api/chats/${chatId}`);
     return res.ok ? res.json() : { cards: [] };
   },
+  // Newest page of a chat; the server loads older turns on demand as the user scrolls up.
+  async getRecentCards(chatId) {
+    const res = await fetch(`/api/chats/${chatId}/cards`);
+    return res.ok ? res.json() : { cards: [] };
+  },
   async saveChat(chatId, payload, title) {
     const res = await fetch(`/api/chats/${chatId}`, {
       method: 'POST',
@@ -43,6 +48,15 @@ const api = {
     });
     return res.ok ? res.json() : null;
   },
+  // One finished turn; the server rewrites only that card. Null when it needs a full save.
+  async saveCard(chatId, seq, card, meta, title) {
+    const res = await fetch(`/api/chats/${chatId}/cards/${seq}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ card, meta, title })
+    });
+    return res.ok ? res.json() : null;
+  },
   async deleteChat(chatId) {
     const res = await fetch(`/api/chats/${chatId}`, { method: 'DELETE' });
     return res.ok;
@@ -153,8 +167,8 @@ const beginTitleEdit = (chatId, titleEl) => {
     const nextTitle = commit ? input.value.trim() : (current.title || 'New chat');
     const finalTitle = nextTitle || 'New chat';
     if (commit && finalTitle !== current.title) {
-      const payload = await api.getChat(chatId);
-      const saved = await api.saveChat(chatId, payload, finalTitle);
+      // No payload: only the title changes, the stored cards stay as they are.
+      const saved = await api.saveChat(chatId, undefined, finalTitle);
       if (saved) {
         const idx = chatIndex.findIndex((c) => c.id === chatId);
         if (idx !== -1) {
@@ -181,6 +195,7 @@ const beginTitleEdit = (chatId, titleEl) => {
 };
 
 const sendImport = (payload) => {
+  if (typeof window.__pylogueImport === 'function' && window.__pylogueImport(payload || [])) return;
   const form = document.getElementById('form');
   const msg = document.getElementById('msg');
   if (!form || !msg) return;
@@ -196,8 +211,8 @@ const selectChat = async (chatId) => {
   setActiveChatId(chatId);
   setActiveChatTitle(chat.title || 'New chat');
   renderChatList(chatIndex);
-  const payload = await api.getChat(chatId);
-  sendImport(payload);
+  const page = await api.getRecentCards(chatId);
+  sendImport({ cards: page.cards || [], meta: page.meta, history: page.history });
   if (isMobile()) closeSidebar();
 };
 
@@ -235,26 +250,54 @@ const confirmDelete = async (chatId, title) => {
   renderChatList(chatIndex);
 };
 
+const applySaved = (chatId, saved, title) => {
+  const idx = chatIndex.findIndex((c) => c.id === chatId);
+  if (idx !== -1) {
+    chatIndex[idx] = { ...chatIndex[idx], ...saved };
+    renderChatList(chatIndex);
+  }
+  if (chatId === getActiveChatId()) {
+    setActiveChatTitle(saved.title || title || 'New chat');
+  }
+};
+
+// Save just the card that finished streaming; fall back to the whole chat if that fails.
+// Turns before the imported page (loaded through OLDER as the user scrolls up) are read from
+// the chats table and never change in the session, so they need no save; the full-save
+// fallback leaves them in place too (see `history.start` in `save_chat`).
+const saveFinishedCard = async (cardId) => {
+  const chatId = getActiveChatId();
+  if (!chatId) return;
+  if (typeof window.__pylogueFetchExport !== 'function') return;
+  const seq = Number.parseInt(cardId, 10);
+  if (!Number.isInteger(seq)) {
+    await saveCurrentChat();
+    return;
+  }
+  const payload = await window.__pylogueFetchExport(cardId);
+  const card = payload?.cards?.[0];
+  if (!card) return;
+  const current = getChatById(chatId);
+  // The title comes from the first question, so only card 0 can set it.
+  const title = deriveTitle(seq === 0 ? [card] : [], current?.title);
+  const saved = await api.saveCard(chatId, seq, card, payload.meta, title);
+  if (saved) {
+    applySaved(chatId, saved, title);
+  } else {
+    await saveCurrentChat();
+  }
+};
+
 const saveCurrentChat = async () => {
   const chatId = getActiveChatId();
   if (!chatId) return;
-  const exportEl = document.getElementById('chat-export');
-  if (!exportEl || !exportEl.value) return;
-  let payload = null;
-  try { payload = JSON.parse(exportEl.value); } catch (err) { return; }
+  if (typeof window.__pylogueFetchExport !== 'function') return;
+  const payload = await window.__pylogueFetchExport();
+  if (!payload) return;
   const current = getChatById(chatId);
   const title = deriveTitle(payload.cards || [], current?.title);
   const saved = await api.saveChat(chatId, payload, title);
-  if (saved) {
-    const idx = chatIndex.findIndex((c) => c.id === chatId);
-    if (idx !== -1) {
-      chatIndex[idx] = { ...chatIndex[idx], ...saved };
-      renderChatList(chatIndex);
-    }
-    if (chatId === getActiveChatId()) {
-      setActiveChatTitle(saved.title || title || 'New chat');
-    }
-  }
+  if (saved) applySaved(chatId, saved, title);
 };
 
 const init = async () => {
@@ -296,25 +339,21 @@ document.addEventListener('keydown', (event) => {
   }
 });
 
-document.body.addEventListener('htmx:wsAfterMessage', () => {
-  saveCurrentChat();
-});
-
-(document.body).addEventListener('htmx:afterSwap', () => {
-  saveCurrentChat();
+document.body.addEventListener('pylogue:stream-end', (event) => {
+  saveFinishedCard(event.detail?.card);
 });
 
-document.addEventListener('click', (event) => {
+document.addEventListener('click', async (event) => {
   const btn = event.target.closest('.copy-chat-btn');
   if (!btn) return;
   if (btn.classList.contains('upload-chat-btn')) return;
   console.log('[chat_app] download override handler fired');
   event.preventDefault();
   event.stopImmediatePropagation();
-  const exportInput = document.getElementById('chat-export');
-  const input = exportInput || document.getElementById('chat-data');
-  if (!input) return;
-  const text = input.value || '[]';
+  if (typeof window.__pylogueFetchExport !== 'function') return;
+  const payload = await window.__pylogueFetchExport();
+  if (!payload) return;
+  const text = JSON.stringify(payload);
   const blob = new Blob([text], { type: 'application/json' });
   const url = URL.createObjectURL(blob);
   const link = document.createElement('a');
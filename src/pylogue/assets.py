@@ -0,0 +1,260 @@
+# Fingerprinted, precompressed copies of the bundled static files.
+import functools
+import gzip
+import hashlib
+import os
+import re
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+
+from fasthtml.core import fhjsscr, htmx_exts, htmxsrc, scopesrc, surrsrc
+from starlette.requests import Request
+from starlette.responses import Response
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+CORE_ASSETS = (
+    "pylogue-core.css",
+    "pylogue-core.js",
+    "pylogue-markdown.js",
+    "pylogue-markdown-blocks.js",
+    "pylogue-markdown-worker.js",
+)
+_MEDIA_TYPES = {
+    ".css": "text/css",
+    ".js": "text/javascript",
+    ".woff2": "font/woff2",
+    ".woff": "font/woff",
+    ".ttf": "font/ttf",
+}
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Pinned third-party front-end files. `pylogue-markdown.js` loads each renderer on first use
+# from its CDN URLs, or, with `vendored=True`, from copies fetched by `pylogue vendor`.
+_JSDELIVR = "https://cdn.jsdelivr.net/npm"
+RENDERERS = {
+    "katex": {
+        "css": {"katex.min.css": f"{_JSDELIVR}/katex@0.16.9/dist/katex.min.css"},
+        "js": {
+            "katex.min.js": f"{_JSDELIVR}/katex@0.16.9/dist/katex.min.js",
+            "auto-render.min.js": f"{_JSDELIVR}/katex@0.16.9/dist/contrib/auto-render.min.js",
+        },
+    },
+    "hljs": {
+        "css": {"github.min.css": f"{_JSDELIVR}/@highlightjs/cdn-assets@11.9.0/styles/github.min.css"},
+        "js": {"highlight.min.js": f"{_JSDELIVR}/@highlightjs/cdn-assets@11.9.0/highlight.min.js"},
+    },
+    "vega": {
+        "js": {
+            "vega.min.js": f"{_JSDELIVR}/vega@5.30.0/build/vega.min.js",
+            "vega-lite.min.js": f"{_JSDELIVR}/vega-lite@5.21.0/build/vega-lite.min.js",
+            "vega-embed.min.js": f"{_JSDELIVR}/vega-embed@6.26.0/build/vega-embed.min.js",
+        },
+    },
+    "mermaid": {"js": {"mermaid.min.js": f"{_JSDELIVR}/mermaid@11.4.1/dist/mermaid.min.js"}},
+}
+VENDOR_FILES = {
+    name: url
+    for renderer in RENDERERS.values()
+    for files in renderer.values()
+    for name, url in files.items()
+}
+# pylogue-markdown-blocks.js relies on this version's lexer (token.raw covers the source exactly).
+_MARKED_ESM = f"{_JSDELIVR}/marked@12.0.2/lib/marked.esm.js"
+VENDOR_MODULES = {
+    "marked.esm.js": _MARKED_ESM,
+}
+# MonsterUI's theme headers, served one by one from /static/vendor/ (their order matters).
+VENDOR_THEME = {
+    "franken-core.min.css": f"{_JSDELIVR}/franken-ui@2.0.0/dist/css/core.min.css",
+    "franken-core.iife.js": f"{_JSDELIVR}/franken-ui@2.0.0/dist/js/core.iife.js",
+    "franken-icon.iife.js": f"{_JSDELIVR}/franken-ui@2.0.0/dist/js/icon.iife.js",
+    "tailwindcss-3.4.17.js": "https://cdn.tailwindcss.com/3.4.17",
+    "daisyui-full.min.css": f"{_JSDELIVR}/daisyui@4.12.24/dist/full.min.css",
+}
+# FastHTML's default page scripts and the `exts="ws"` extension. The URLs come from fasthtml
+# itself, so they match the headers it puts on every page.
+VENDOR_PAGE = {
+    "htmx.js": htmxsrc.attrs["src"],
+    "htmx-ext-ws.js": htmx_exts["ws"],
+    "fasthtml.js": fhjsscr.attrs["src"],
+    "surreal.js": surrsrc.attrs["src"],
+    "css-scope-inline.js": scopesrc.attrs["src"],
+}
+# ES module specifiers imported by pylogue-markdown.js, resolved through an import map.
+CDN_IMPORTS = {
+    "marked": _MARKED_ESM,
+}
+_KATEX_FONT_RE = re.compile(r"url\((fonts/[^)]+)\)")
+
+
+@dataclass(frozen=True)
+class StaticAsset:
+    name: str
+    body: bytes
+    digest: str
+    media_type: str
+    # (content-encoding, body) pairs, preferred first.
+    encoded: tuple[tuple[str, bytes], ...] = ()
+
+    @property
+    def url(self) -> str:
+        stem, _, ext = self.name.rpartition(".")
+        return f"/static/{stem}.{self.digest[:12]}.{ext}"
+
+    @property
+    def etag(self) -> str:
+        # Weak, so it also validates the gzip/brotli representations.
+        return f'W/"{self.digest[:32]}"'
+
+
+def _compress(body: bytes) -> tuple[tuple[str, bytes], ...]:
+    encoded = []
+    try:
+        import brotli
+    except Exception:
+        brotli = None
+    if brotli is not None:
+        encoded.append(("br", brotli.compress(body, quality=11)))
+    encoded.append(("gzip", gzip.compress(body, compresslevel=9, mtime=0)))
+    return tuple((name, data) for name, data in encoded if len(data) < len(body))
+
+
+def _make_asset(name: str, body: bytes) -> StaticAsset:
+    return StaticAsset(
+        name=name,
+        body=body,
+        digest=hashlib.sha256(body).hexdigest(),
+        media_type=_MEDIA_TYPES.get(Path(name).suffix, "application/octet-stream"),
+        encoded=_compress(body),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def core_asset(name: str) -> StaticAsset:
+    """Load, hash and precompress one bundled file once per process."""
+    return _make_asset(name, (STATIC_DIR / name).read_bytes())
+
+
+def vendor_dir() -> Path:
+    return Path(os.getenv("PYLOGUE_VENDOR_DIR") or STATIC_DIR / "vendor")
+
+
+def vendor_available() -> bool:
+    names = [*VENDOR_FILES, *VENDOR_MODULES, *VENDOR_THEME, *VENDOR_PAGE]
+    return all((vendor_dir() / name).is_file() for name in names)
+
+
+def _require_vendor() -> Path:
+    if not vendor_available():
+        raise RuntimeError(
+            f"Vendored front-end files are missing from {vendor_dir()}. Download them with `pylogue vendor`."
+        )
+    return vendor_dir()
+
+
+@functools.lru_cache(maxsize=None)
+def vendor_bundle(renderer: str, kind: str) -> StaticAsset:
+    """One renderer's vendored stylesheets (`kind="css"`) or scripts (`kind="js"`) as one asset."""
+    root = _require_vendor()
+    names = RENDERERS[renderer][kind]
+    if kind == "css":
+        # KaTeX links its fonts relative to its own URL; point them at the vendor file route.
+        text = "\n".join(
+            _KATEX_FONT_RE.sub(r"url(/static/vendor/\1)", (root / name).read_text(encoding="utf-8"))
+            for name in names
+        )
+        return _make_asset(f"pylogue-{renderer}.css", text.encode("utf-8"))
+    # A newline plus `;` keeps one minified file from running into the next.
+    body = b"\n;".join((root / name).read_bytes() for name in names)
+    return _make_asset(f"pylogue-{renderer}.js", body)
+
+
+def vendor_bundles() -> list[StaticAsset]:
+    return [vendor_bundle(name, kind) for name, spec in RENDERERS.items() for kind in spec]
+
+
+def renderer_config(vendored: bool = False) -> dict:
+    """Per-renderer `{"css": [...], "js": [...]}` URLs that pylogue-markdown.js loads on demand."""
+    if vendored:
+        return {
+            name: {kind: [vendor_bundle(name, kind).url] for kind in spec}
+            for name, spec in RENDERERS.items()
+        }
+    return {name: {kind: list(files.values()) for kind, files in spec.items()} for name, spec in RENDERERS.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def vendor_module(name: str) -> StaticAsset:
+    asset = _make_asset(name, (_require_vendor() / name).read_bytes())
+    return StaticAsset(**{**asset.__dict__, "name": f"vendor/{name}"})
+
+
+@functools.lru_cache(maxsize=64)
+def vendor_file(path: str) -> StaticAsset | None:
+    """A file under the vendor dir (theme files, KaTeX fonts), or None for unknown paths."""
+    root = vendor_dir().resolve()
+    target = (root / path).resolve()
+    if root not in target.parents or not target.is_file():
+        return None
+    return _make_asset(path, target.read_bytes())
+
+
+def vendor_url(cdn_url: str) -> str | None:
+    """Local URL replacing a theme or page script CDN URL, if it is one of VENDOR_THEME or VENDOR_PAGE."""
+    for name, url in {**VENDOR_THEME, **VENDOR_PAGE}.items():
+        if url == cdn_url:
+            return f"/static/vendor/{name}"
+    return None
+
+
+def import_map(vendored: bool = False) -> dict:
+    """Import map for the ES modules pylogue-markdown.js imports (`marked`, its block renderer)."""
+    blocks = {"pylogue/markdown-blocks": core_asset("pylogue-markdown-blocks.js").url}
+    if not vendored:
+        return {"imports": {**CDN_IMPORTS, **blocks}}
+    return {"imports": {"marked": vendor_module("marked.esm.js").url, **blocks}}
+
+
+def vendor_frontend(dest: str | Path | None = None) -> Path:
+    """Download the pinned front-end files (and KaTeX fonts) into `dest` for offline serving."""
+    root = Path(dest) if dest else vendor_dir()
+    (root / "fonts").mkdir(parents=True, exist_ok=True)
+    for name, url in {**VENDOR_FILES, **VENDOR_MODULES, **VENDOR_THEME, **VENDOR_PAGE}.items():
+        with urllib.request.urlopen(url, timeout=60) as response:
+            (root / name).write_bytes(response.read())
+    katex_base = VENDOR_FILES["katex.min.css"].rsplit("/", 1)[0]
+    css = (root / "katex.min.css").read_text(encoding="utf-8")
+    for font in sorted(set(_KATEX_FONT_RE.findall(css))):
+        with urllib.request.urlopen(f"{katex_base}/{font}", timeout=60) as response:
+            (root / font).write_bytes(response.read())
+    return root
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in {"q=0", "q=0.0", "q=0.00", "q=0.000"}:
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def asset_response(request: Request, asset: StaticAsset, immutable: bool = True) -> Response:
+    """Serve `asset` with ETag/304 and the best precompressed encoding the client accepts."""
+    headers = {
+        "ETag": asset.etag,
+        "Cache-Control": _IMMUTABLE if immutable else "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in tags or asset.etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers=headers)
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    for encoding, body in asset.encoded:
+        if encoding in accepted:
+            return Response(body, media_type=asset.media_type, headers={**headers, "Content-Encoding": encoding})
+    return Response(asset.body, media_type=asset.media_type, headers=headers)
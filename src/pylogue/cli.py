@@ -0,0 +1,155 @@
+# Command line entry point: `pylogue serve`
+import logging
+import os
+from pathlib import Path
+
+import typer
+import uvicorn
+from uvicorn.supervisors import ChangeReload, Multiprocess
+from uvicorn.supervisors import multiprocess
+
+cli = typer.Typer(help="Pylogue command line.", no_args_is_help=True)
+
+
+def _pylogue_app(app):
+    # uvicorn wraps the ASGI app in middleware that keeps the inner app as `.app`.
+    while app is not None and not hasattr(getattr(app, "state", None), "pylogue_drains"):
+        app = getattr(app, "app", None)
+    return app
+
+
+class _DrainingServer(uvicorn.Server):
+    """uvicorn server that drains pylogue sessions before it closes connections.
+
+    uvicorn closes every websocket before the lifespan shutdown runs, too late to hand
+    prompts back or to send clients to another worker with a 1012 close.
+    """
+
+    async def shutdown(self, sockets=None):
+        app = _pylogue_app(getattr(self.config, "loaded_app", None))
+        if app is not None and not self.force_exit:
+            from pylogue.core import drain_app
+
+            # Stop accepting first, so clients closed by the drain reconnect to another worker.
+            for server in self.servers:
+                server.close()
+            try:
+                await drain_app(app)
+            except Exception:
+                logging.getLogger("uvicorn.error").exception("Draining pylogue sessions failed")
+        await super().shutdown(sockets=sockets)
+
+
+class _DrainingProcess(multiprocess.Process):
+    @property
+    def server(self):
+        if self._server is None:
+            self._server = _DrainingServer(config=self.config)
+        return self._server
+
+
+def _run(config: uvicorn.Config) -> None:
+    """`uvicorn.run` for a prepared config, with `_DrainingServer` in every worker."""
+    server = _DrainingServer(config=config)
+    try:
+        if config.should_reload:
+            ChangeReload(config, target=server.run, sockets=[config.bind_socket()]).run()
+        elif config.workers > 1:
+            # Multiprocess builds each worker from this module global.
+            multiprocess.Process = _DrainingProcess
+            Multiprocess(config, sockets=[config.bind_socket()]).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
+    if not server.started and not config.should_reload and config.workers == 1:
+        raise typer.Exit(code=3)
+
+
+@cli.callback()
+def _main():
+    """Pylogue command line."""
+
+
+@cli.command()
+def serve(
+    target: str = typer.Argument("pylogue.core:main", help="App factory (or app with --no-factory) as module:attr."),
+    host: str = typer.Option("0.0.0.0", help="Bind address."),
+    port: int = typer.Option(5001, help="Bind port."),
+    workers: int = typer.Option(1, min=1, help="Number of worker processes."),
+    factory: bool = typer.Option(True, help="Treat TARGET as a factory returning the app."),
+    session_store: str = typer.Option(
+        None,
+        envvar="PYLOGUE_SESSION_STORE",
+        help="Shared session store: memory://, sqlite:///path.db or redis://host:port/db.",
+    ),
+    embed_store: str = typer.Option(
+        None,
+        envvar="PYLOGUE_EMBED_STORE",
+        help="Shared embeds cache: memory://, sqlite:///path.db or redis://host:port/db.",
+    ),
+    graceful_timeout: float = typer.Option(
+        30.0, help="Seconds to let in-flight streams finish on shutdown."
+    ),
+    vendored: bool = typer.Option(
+        False,
+        envvar="PYLOGUE_VENDORED",
+        help="Serve the front-end libraries from `pylogue vendor` copies instead of CDNs.",
+    ),
+    reload: bool = typer.Option(False, help="Reload on code changes (development; single worker)."),
+):
+    """Run a Pylogue app under uvicorn, optionally with several workers sharing state."""
+    if workers > 1:
+        # Every worker must see the same sessions and embeds, or reconnects and tool HTML break.
+        # No default file: it would hold conversation text somewhere every local user can read.
+        missing = [
+            option
+            for option, url in (("--session-store", session_store), ("--embed-store", embed_store))
+            if not url or url.startswith("memory:")
+        ]
+        if missing:
+            typer.echo(
+                f"--workers {workers} needs a shared store; pass {' and '.join(missing)} "
+                "(sqlite:///path.db or redis://host:port/db).",
+                err=True,
+            )
+            raise typer.Exit(code=2)
+    # Workers are separate processes; they pick these up in register_ws_routes and pylogue.embeds.
+    if session_store:
+        os.environ["PYLOGUE_SESSION_STORE"] = session_store
+    if embed_store:
+        os.environ["PYLOGUE_EMBED_STORE"] = embed_store
+    if vendored:
+        os.environ["PYLOGUE_VENDORED"] = "1"
+    _run(
+        uvicorn.Config(
+            target,
+            host=host,
+            port=port,
+            workers=None if reload else workers,
+            reload=reload,
+            factory=factory,
+            timeout_graceful_shutdown=graceful_timeout,
+        )
+    )
+
+
+@cli.command()
+def vendor(
+    dest: Path = typer.Option(
+        None,
+        envvar="PYLOGUE_VENDOR_DIR",
+        help="Where to write the files (default: the package's static/vendor directory).",
+    ),
+):
+    """Download the pinned front-end libraries so pages work without CDN access."""
+    from pylogue.assets import vendor_frontend
+
+    root = vendor_frontend(dest)
+    typer.echo(f"Vendored front-end files written to {root}.")
+    if dest:
+        typer.echo("Set PYLOGUE_VENDOR_DIR to this path when serving.")
+
+
+if __name__ == "__main__":
+    cli()
@@ -2,11 +2,14 @@
 from fasthtml.common import *
 from monsterui.all import Theme, Container, ContainerT, TextPresets, Button, ButtonT, FastHTML as MUFastHTML, UkIcon
 from dataclasses import dataclass
-from pathlib import Path
 from urllib.parse import quote_plus
 from starlette.requests import Request
-from starlette.responses import FileResponse, RedirectResponse
+from starlette.responses import JSONResponse, RedirectResponse, Response
+from collections import deque
 import asyncio
+import concurrent.futures
+import copy
+import functools
 import inspect
 import json
 import base64
@@ -14,11 +17,76 @@ import html as html_lib
 import logging
 import os
 import re
+import secrets
+import time
+import weakref
+
+from pylogue.assets import (
+    CORE_ASSETS,
+    asset_response,
+    core_asset,
+    import_map,
+    renderer_config,
+    vendor_available,
+    vendor_bundles,
+    vendor_file,
+    vendor_module,
+    vendor_url,
+)
+from pylogue.embeds import EMBED_PATH, embed_tokens, get_embed_store, get_html, resolve_embeds, take_html
+from pylogue.sessions import InMemorySessionStore, SessionStore, session_store_from_url
 
 IMPORT_PREFIX = "__PYLOGUE_IMPORT__:"
+IMPORT_CHUNK_PREFIX = "__PYLOGUE_IMPORT_CHUNK__:"
 STOP_PREFIX = "__PYLOGUE_STOP__:"
-_CORE_STATIC_DIR = Path(__file__).resolve().parent / "static"
+RESYNC_PREFIX = "__PYLOGUE_RESYNC__:"
+RESUME_PREFIX = "__PYLOGUE_RESUME__:"
+OLDER_PREFIX = "__PYLOGUE_OLDER__:"
 _LOG = logging.getLogger(__name__)
+_METRICS: dict[str, float] = {
+    "slow_client_disconnects": 0,
+    "collapsed_updates": 0,
+    "sessions_hibernated": 0,
+    "sessions_rehydrated": 0,
+    "offloaded_tasks": 0,
+    "loop_lag_ms": 0.0,
+    "loop_lag_max_ms": 0.0,
+}
+
+
+def get_metrics() -> dict[str, float]:
+    """Return a snapshot of process-wide streaming counters."""
+    return dict(_METRICS)
+
+
+def _on_app_shutdown(app, handler) -> bool:
+    lifespan = getattr(app.router, "lifespan_context", None)
+    hooks = getattr(lifespan, "shutdown", None)
+    if isinstance(hooks, list):
+        hooks.append(handler)
+        return True
+    hooks = getattr(app.router, "on_shutdown", None)
+    if isinstance(hooks, list):
+        hooks.append(handler)
+        return True
+    return False
+
+
+async def drain_app(app, timeout: float | None = None):
+    """Drain every `register_ws_routes` mount on `app` (see `drain_timeout`)."""
+    drains = list(getattr(app.state, "pylogue_drains", []))
+    await asyncio.gather(*(drain(timeout) for drain in drains))
+
+
+async def _monitor_loop_lag(interval: float):
+    """Record how late the event loop wakes a sleeping task (`loop_lag_ms`, `loop_lag_max_ms`)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = round(max(0.0, loop.time() - started - interval) * 1000, 2)
+        _METRICS["loop_lag_ms"] = lag
+        _METRICS["loop_lag_max_ms"] = max(_METRICS["loop_lag_max_ms"], lag)
 
 
 @dataclass(frozen=True)
@@ -121,22 +189,86 @@ def _build_responder_context(conn):
     }
 
 
-def _invoke_responder(responder, prompt: str, context):
-    try:
-        signature = inspect.signature(responder)
-    except (TypeError, ValueError):
-        signature = None
+class _ResponderAdapter:
+    """Calling convention of a responder, resolved once rather than per message.
 
-    if signature is not None:
-        params = signature.parameters
-        if "context" in params or any(
-            p.kind == inspect.Parameter.VAR_KEYWORD for p in params.values()
-        ):
+    `kind` is "asyncgen", "coroutine" or "sync"; `context` is "keyword",
+    "positional" or None depending on how the responder accepts the context.
+    """
+
+    __slots__ = ("kind", "context")
+
+    def __init__(self, kind: str, context: str | None):
+        self.kind = kind
+        self.context = context
+
+    def __call__(self, responder, prompt: str, context):
+        if self.context == "keyword":
             return responder(prompt, context=context)
-    try:
+        if self.context == "positional":
+            return responder(prompt, context)
         return responder(prompt)
+
+
+_RESPONDER_ADAPTERS = weakref.WeakKeyDictionary()
+
+
+def _responder_target(responder):
+    if inspect.isfunction(responder) or inspect.ismethod(responder) or isinstance(
+        responder, functools.partial
+    ):
+        return responder
+    call = getattr(type(responder), "__call__", None)
+    return call.__get__(responder) if call is not None else responder
+
+
+def _resolve_responder_adapter(responder) -> _ResponderAdapter:
+    target = _responder_target(responder)
+    if inspect.isasyncgenfunction(target):
+        kind = "asyncgen"
+    elif inspect.iscoroutinefunction(target):
+        kind = "coroutine"
+    else:
+        kind = "sync"
+    try:
+        params = list(inspect.signature(target).parameters.values())
+    except (TypeError, ValueError):
+        return _ResponderAdapter(kind, None)
+    if any(p.name == "context" or p.kind == inspect.Parameter.VAR_KEYWORD for p in params):
+        return _ResponderAdapter(kind, "keyword")
+    positional = [
+        p
+        for p in params
+        if p.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+    ]
+    # An optional second parameter (`def respond(message, temperature=0.7)`) is not a context slot.
+    if (len(positional) >= 2 and positional[1].default is inspect.Parameter.empty) or any(
+        p.kind == inspect.Parameter.VAR_POSITIONAL for p in params
+    ):
+        return _ResponderAdapter(kind, "positional")
+    return _ResponderAdapter(kind, None)
+
+
+def _responder_adapter(responder) -> _ResponderAdapter:
+    """Adapter for `responder`, cached per function or per responder class."""
+    if inspect.ismethod(responder):
+        key = responder.__func__
+    elif inspect.isfunction(responder) or isinstance(responder, functools.partial):
+        key = responder
+    else:
+        key = type(responder)
+    try:
+        return _RESPONDER_ADAPTERS[key]
+    except KeyError:
+        pass
+    except TypeError:
+        return _resolve_responder_adapter(responder)
+    adapter = _resolve_responder_adapter(responder)
+    try:
+        _RESPONDER_ADAPTERS[key] = adapter
     except TypeError:
-        return responder(prompt, context)
+        pass
+    return adapter
 
 
 def _oauth_base_url(request: Request) -> str:
@@ -250,22 +382,46 @@ def _register_google_auth_routes(app, cfg: GoogleOAuthConfig, base_path: str = "
     }
 
 
-def register_core_static(app):
+def register_core_static(app, vendored: bool | None = None):
+    """Serve the core static files, plus the `pylogue vendor` copies when they are present.
+
+    With `vendored` (default: `PYLOGUE_VENDORED`, or headers from `get_core_headers(vendored=True)`),
+    FastHTML's own page scripts are rewritten to the vendored copies too.
+    """
     if getattr(app, "_pylogue_static_registered", False):
         return
     app._pylogue_static_registered = True
 
-    @app.route("/static/pylogue-core.css")
-    def _pylogue_core_css():
-        return FileResponse(_CORE_STATIC_DIR / "pylogue-core.css")
+    # `get_core_headers` links the fingerprinted URLs, cached as immutable. The plain names stay
+    # available for existing pages and revalidate with their ETag instead.
+    def _handler(asset, immutable):
+        async def _serve(request: Request):
+            return asset_response(request, asset, immutable=immutable)
 
-    @app.route("/static/pylogue-core.js")
-    def _pylogue_core_js():
-        return FileResponse(_CORE_STATIC_DIR / "pylogue-core.js")
+        return _serve
 
-    @app.route("/static/pylogue-markdown.js")
-    def _pylogue_markdown_js():
-        return FileResponse(_CORE_STATIC_DIR / "pylogue-markdown.js")
+    for name in CORE_ASSETS:
+        asset = core_asset(name)
+        app.route(asset.url, methods=["GET"])(_handler(asset, True))
+        app.route(f"/static/{name}", methods=["GET"])(_handler(asset, False))
+
+    if not vendor_available():
+        return
+    if vendored is None:
+        vendored = _env_bool("PYLOGUE_VENDORED") or _links_vendor_files(app)
+    if vendored:
+        _vendor_app_headers(app)
+    # Offline mode (`get_core_headers(vendored=True)`): files fetched once with `pylogue vendor`.
+    for asset in (*vendor_bundles(), vendor_module("marked.esm.js")):
+        app.route(asset.url, methods=["GET"])(_handler(asset, True))
+
+    @app.route("/static/vendor/{path:path}", methods=["GET"])
+    async def _pylogue_vendor_file(request: Request, path: str):
+        asset = vendor_file(path)
+        if asset is None:
+            return Response("Not found", status_code=404)
+        # Vendored files are pinned versions, so they never change under one URL.
+        return asset_response(request, asset)
 
 class EchoResponder:
     async def __call__(self, message: str, context=None):
@@ -291,65 +447,115 @@ def render_input():
     )
 
 
-def render_cards(cards):
+def _render_card_rows(card):
+    card_id = card.get("id", "")
+    assistant_id = f"assistant-{card_id}" if card_id else ""
+    user_row = Div(
+        P("You", cls=(TextPresets.muted_sm, "text-right")),
+        Div(
+            card["question"],
+            data_raw_b64=base64.b64encode(card["question"].encode("utf-8")).decode("ascii"),
+            cls="marked text-base text-right",
+        ),
+        cls="chat-row-block chat-row-user",
+    )
+    assistant_row = Div(
+        P("Assistant", cls=(TextPresets.muted_sm, "text-left")),
+        Div(
+            Button(
+                UkIcon("copy"),
+                cls="uk-button uk-button-text copy-btn",
+                type="button",
+                data_copy_target=assistant_id,
+                aria_label="Copy response",
+                title="Copy response",
+            ),
+            cls="flex justify-end",
+        ),
+        Div(
+            card["answer"] or "…",
+            id=assistant_id if assistant_id else None,
+            data_raw_b64=base64.b64encode((card["answer"] or "").encode("utf-8")).decode("ascii"),
+            cls="marked text-base text-left",
+        ),
+        cls="chat-row-block chat-row-assistant",
+    )
+    return user_row, assistant_row
+
+
+def _render_older_marker(start: int, oob: bool = False):
+    # Stands in for cards[:start]; pylogue-core.js requests them when it scrolls into view.
+    return Div(
+        id="cards-older",
+        data_before=str(start),
+        cls="cards-older",
+        hx_swap_oob="true" if oob else None,
+    )
+
+
+def render_cards(cards, start: int = 0):
+    """Render `cards`; `start` > 0 means they begin at that index and older ones load on request."""
     rows = []
-    data_json = json.dumps(cards)
     for card in cards:
-        card_id = card.get("id", "")
-        assistant_id = f"assistant-{card_id}" if card_id else ""
-        rows.append(
-            Div(
-                P("You", cls=(TextPresets.muted_sm, "text-right")),
-                Div(
-                    card["question"],
-                    data_raw_b64=base64.b64encode(card["question"].encode("utf-8")).decode("ascii"),
-                    cls="marked text-base text-right",
-                ),
-                cls="chat-row-block chat-row-user",
-            )
-        )
-        rows.append(
-            Div(
-                P("Assistant", cls=(TextPresets.muted_sm, "text-left")),
-                Div(
-                    Button(
-                        UkIcon("copy"),
-                        cls="uk-button uk-button-text copy-btn",
-                        type="button",
-                        data_copy_target=assistant_id,
-                        aria_label="Copy response",
-                        title="Copy response",
-                    ),
-                    cls="flex justify-end",
-                ),
-                Div(
-                    card["answer"] or "…",
-                    id=assistant_id if assistant_id else None,
-                    data_raw_b64=base64.b64encode((card["answer"] or "").encode("utf-8")).decode("ascii"),
-                    cls="marked text-base text-left",
-                ),
-                cls="chat-row-block chat-row-assistant",
-            )
-        )
+        rows.extend(_render_card_rows(card))
     return Div(
+        _render_older_marker(start) if start else None,
         *rows,
         Div(id="scroll-anchor"),
-        Input(type="hidden", id="chat-data", value=data_json),
-        Input(type="hidden", id="chat-export", value=json.dumps({"cards": cards})),
         id="cards",
         cls="divide-y divide-slate-200",
     )
 
 
-def render_chat_data(cards):
-    return Input(
-        type="hidden",
-        id="chat-data",
-        value=json.dumps(cards),
-        hx_swap_oob="true",
-    )
+def render_card_append(card):
+    # OOB-inserts one turn before #scroll-anchor; the rest of #cards stays untouched.
+    return Div(*_render_card_rows(card), hx_swap_oob="beforebegin:#scroll-anchor")
+
+
+def render_cards_prepend(cards, start: int = 0):
+    # OOB-inserts an older page of turns below #cards-older, then moves the marker to `start`.
+    rows = []
+    for card in cards:
+        rows.extend(_render_card_rows(card))
+    return Div(*rows, hx_swap_oob="afterend:#cards-older"), _render_older_marker(start, oob=True)
+
+
+# Picklable entry points for the offload executor (thread or process pool).
+def _render_cards_html(cards, start: int = 0) -> str:
+    return to_xml(render_cards(cards, start=start))
+
+
+def _render_cards_prepend_html(cards, start: int = 0) -> str:
+    return to_xml(render_cards_prepend(cards, start=start))
+
+
+def _inline_embeds(cards):
+    # Cards with `/embeds` placeholders, copied with the HTML inlined; the rest as they are.
+    return [
+        {**card, "answer": resolve_embeds(card["answer"])}
+        if isinstance(card, dict) and 'data-embed="' in (card.get("answer") or "")
+        else card
+        for card in cards
+    ]
+
+
+def _references_embed(cards, token) -> bool:
+    return any(isinstance(card, dict) and token in embed_tokens(card.get("answer")) for card in cards)
+
+
+def _resolve_answer_embeds(answer):
+    # `answer` with its `/embeds` HTML inlined, plus the tokens it referenced.
+    return resolve_embeds(answer), embed_tokens(answer)
+
 
-_TOOL_HTML_RE = re.compile(r'<div class="tool-html">.*?</div>', re.DOTALL)
+def _export_json(cards, meta=None, history=None) -> str:
+    payload = build_export_payload(cards, history=history)
+    if meta:
+        payload["meta"] = meta
+    return json.dumps(payload)
+
+
+_TOOL_HTML_RE = re.compile(r'<div class="tool-html"[^>]*>.*?</div>', re.DOTALL)
 _TAG_RE = re.compile(r"<[^>]+>")
 
 
@@ -361,20 +567,26 @@ def _normalize_answer_for_history(answer: str) -> str:
     return html_lib.unescape(text).strip()
 
 
-def build_export_payload(cards, responder=None):
+def build_export_payload(cards, responder=None, history=None):
+    """Export payload for `cards`. Tool HTML streamed as `/embeds` placeholders is inlined
+    again, so exports and saved history keep it after the embed expires."""
     export_cards = []
     for card in cards:
         if not isinstance(card, dict):
             continue
-        answer = card.get("answer", "")
+        # Finished and imported cards carry a memoized answer_text; only an in-flight answer is normalized here.
         answer_text = card.get("answer_text")
-        if not isinstance(answer_text, str) or not answer_text.strip():
-            answer_text = _normalize_answer_for_history(answer)
+        if not isinstance(answer_text, str):
+            answer_text = _normalize_answer_for_history(card.get("answer", ""))
         export_card = dict(card)
+        export_card["answer"] = resolve_embeds(card.get("answer", ""))
         export_card["answer_text"] = answer_text
         export_cards.append(export_card)
 
     payload = {"cards": export_cards}
+    if history:
+        # `cards` is the tail of a longer stored chat, starting at history["start"].
+        payload["history"] = dict(history)
     if responder is not None and hasattr(responder, "get_export_state"):
         try:
             meta = responder.get_export_state()
@@ -385,17 +597,6 @@ def build_export_payload(cards, responder=None):
     return payload
 
 
-def render_chat_export(cards, responder=None):
-    payload = build_export_payload(cards, responder=responder)
-    return Input(
-        type="hidden",
-        id="chat-export",
-        value=json.dumps(payload),
-        hx_swap_oob="true",
-    )
-
-
-
 def render_assistant_update(card):
     card_id = card.get("id", "")
     assistant_id = f"assistant-{card_id}" if card_id else ""
@@ -408,34 +609,451 @@ def render_assistant_update(card):
     )
 
 
-def get_core_headers(include_markdown: bool = True):
+def render_control_frame(kind: str, **data):
+    # Control frames carry no id, so htmx ignores them; pylogue-core.js consumes them.
+    return Div(
+        cls="pylogue-control",
+        data_kind=kind,
+        **{f"data_{key}": str(value) for key, value in data.items()},
+    )
+
+
+def render_assistant_delta(card, chunk: str, offset: int, stream_id: str | None = None):
+    """Append-only update: `chunk` starts at UTF-8 byte `offset` of the card's answer."""
+    card_id = card.get("id", "")
+    data = {
+        "target": f"assistant-{card_id}",
+        "offset": offset,
+        "chunk_b64": base64.b64encode(chunk.encode("utf-8")).decode("ascii"),
+    }
+    if stream_id:
+        data["stream"] = stream_id
+    return render_control_frame("delta", **data)
+
+
+_FLUSH_MARKERS = ('class="tool-status', 'class="tool-html"', 'class="tool-call"')
+
+
+class _ChunkCoalescer:
+    """Buffer streamed chunks and flush them on a time budget, a byte threshold or a tool marker."""
+
+    def __init__(self, flush, interval: float = 0.04, max_bytes: int = 4096):
+        self._flush_cb = flush
+        self._interval = interval
+        self._max_bytes = max_bytes
+        self._parts: list[str] = []
+        self._size = 0
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    async def add(self, chunk: str):
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self._size += len(chunk)
+        if (
+            self._interval <= 0
+            or self._size >= self._max_bytes
+            or any(marker in chunk for marker in _FLUSH_MARKERS)
+        ):
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self._interval)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        timer, self._timer = self._timer, None
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        async with self._lock:
+            if not self._parts:
+                return
+            text = "".join(self._parts)
+            self._parts.clear()
+            self._size = 0
+            await self._flush_cb(text)
+
+
+class _SessionOutbox:
+    """Bounded per-connection send queue drained by a dedicated writer task.
+
+    Intermediate updates are queued with a `key`; when the queue is full,
+    pending updates for that key collapse into one `snapshot()` rendered at
+    send time. A send that blocks longer than `send_timeout` closes the socket,
+    and so does any frame that finds the queue full with nothing to collapse.
+    """
+
+    def __init__(self, send, close=None, max_size: int = 64, send_timeout: float = 10.0):
+        self._send = send
+        self._close = close
+        self._max_size = max_size
+        self._send_timeout = send_timeout
+        self._items: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._writer = None
+        self._closer = None
+        self.closed = False
+
+    def put(self, message, key=None, snapshot=None):
+        if self.closed:
+            return
+        if key is not None and snapshot is not None and len(self._items) >= self._max_size:
+            before = len(self._items)
+            self._items = deque(item for item in self._items if item[0] != key)
+            _METRICS["collapsed_updates"] += before - len(self._items) + 1
+            message = snapshot
+        if len(self._items) >= self._max_size:
+            # Nothing collapsed: the client has stopped reading, and the queue must not grow.
+            _METRICS["slow_client_disconnects"] += 1
+            _LOG.warning("Closing WebSocket: %d frames queued for a client that is not reading", self._max_size)
+            self.close()
+            self._closer = asyncio.create_task(self._shutdown(code=1013))
+            return
+        self._items.append((key, message))
+        self._wakeup.set()
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self.closed:
+            if not self._items:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            _, message = self._items.popleft()
+            if callable(message):
+                message = message()
+            try:
+                if inspect.isawaitable(message):
+                    # Offloaded render: wait for it here so frames keep their order.
+                    message = await message
+                await asyncio.wait_for(self._send(message), timeout=self._send_timeout)
+            except asyncio.TimeoutError:
+                _METRICS["slow_client_disconnects"] += 1
+                _LOG.warning("Closing WebSocket: client did not read for %.1fs", self._send_timeout)
+                await self._shutdown(code=1013)
+                return
+            except Exception:
+                await self._shutdown()
+                return
+
+    async def _shutdown(self, code: int | None = None):
+        self.closed = True
+        self._items.clear()
+        if self._close is None or code is None:
+            return
+        try:
+            await asyncio.wait_for(self._close(code=code), timeout=1.0)
+        except Exception:
+            pass
+
+    async def close_after_flush(self, code: int, timeout: float = 2.0):
+        """Let queued frames go out, then close the socket with `code`."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._items and not self.closed and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        await self._shutdown(code=code)
+
+    def close(self):
+        self.closed = True
+        self._items.clear()
+        self._wakeup.set()
+        writer, self._writer = self._writer, None
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+
+class _StoreWriter:
+    """Per-session queue that runs session store calls in order on `executor`, off the event loop.
+
+    Chunks queued for the same card while an earlier write is still running are merged
+    into one `append_chunk` call, so a slow store sees one write per batch, not per flush.
+    """
+
+    def __init__(self, executor=None):
+        self._executor = executor
+        self._items: deque = deque()
+        self._task = None
+
+    def append_chunk(self, store, session_id: str, card_id: str, chunk: str):
+        last = self._items[-1] if self._items else None
+        if last is not None and last[0] is None and last[1][:3] == (store, session_id, card_id):
+            last[1] = (store, session_id, card_id, last[1][3] + chunk)
+        else:
+            self._items.append([None, (store, session_id, card_id, chunk), None])
+        self._start()
+
+    def submit(self, func, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._items.append([func, args, future])
+        self._start()
+        return future
+
+    async def flush(self):
+        """Wait until everything queued so far has been written."""
+        if self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._items:
+            func, args, future = self._items.popleft()
+            if func is None:
+                store, session_id, card_id, chunk = args
+                func, args = store.append_chunk, (session_id, card_id, chunk)
+            try:
+                result = await loop.run_in_executor(self._executor, functools.partial(func, *args))
+            except Exception:
+                # Most writes are queued without being awaited, so failures are logged, not raised.
+                _LOG.exception("Session store write failed")
+                result = None
+            if future is not None and not future.done():
+                future.set_result(result)
+
+
+def _vendor_header(header):
+    attrs = getattr(header, "attrs", None)
+    if not isinstance(attrs, dict):
+        return header
+    local = {key: vendor_url(attrs.get(key) or "") for key in ("src", "href")}
+    local = {key: url for key, url in local.items() if url}
+    if not local:
+        return header
+    # Copy: fasthtml's default headers are module-level objects shared by every app.
+    header = copy.copy(header)
+    header.attrs = {**attrs, **local}
+    return header
+
+
+def _links_vendor_files(app) -> bool:
+    for header in getattr(app, "hdrs", None) or ():
+        attrs = getattr(header, "attrs", None) or {}
+        if any(str(attrs.get(key) or "").startswith("/static/vendor/") for key in ("src", "href")):
+            return True
+    return False
+
+
+def _vendor_app_headers(app):
+    """Point the scripts FastHTML adds to every page (htmx, its ws extension, ...) at vendored copies."""
+    hdrs = getattr(app, "hdrs", None)
+    if isinstance(hdrs, list):
+        # In place: FastHTML's error pages hold the same list.
+        hdrs[:] = [_vendor_header(header) for header in hdrs]
+    elif isinstance(hdrs, tuple):
+        app.hdrs = tuple(_vendor_header(header) for header in hdrs)
+
+
+def get_core_headers(include_markdown: bool = True, vendored: bool | None = None):
+    """Page headers for the core UI.
+
+    `vendored` (default: the `PYLOGUE_VENDORED` env var) links pinned copies served by
+    `register_core_static` instead of CDNs; fetch them first with `pylogue vendor`.
+    """
+    if vendored is None:
+        vendored = _env_bool("PYLOGUE_VENDORED")
     headers = list(Theme.slate.headers())
+    if vendored:
+        headers = [_vendor_header(header) for header in headers]
     if include_markdown:
-        headers.extend(
-            [
-                Link(rel="stylesheet", href="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.css"),
-                Link(
-                    rel="stylesheet",
-                    href="https://cdn.jsdelivr.net/npm/@highlightjs/cdn-assets@11.9.0/styles/github.min.css",
-                ),
-                Script(src="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.js"),
-                Script(src="https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/contrib/auto-render.min.js"),
-                Script(src="https://cdn.jsdelivr.net/npm/vega@5"),
-                Script(src="https://cdn.jsdelivr.net/npm/vega-lite@5"),
-                Script(src="https://cdn.jsdelivr.net/npm/vega-embed@6"),
-            ]
-        )
+        # Module scripts resolve `marked` through this map, so it must come first.
+        headers.insert(0, Script(json.dumps(import_map(vendored=vendored)), type="importmap"))
+        # KaTeX, highlight.js, Vega and mermaid are fetched by pylogue-markdown.js on first use;
+        # markdown itself is parsed in the worker named by data-worker.
         headers.append(
-            Script(src="https://cdn.jsdelivr.net/npm/@highlightjs/cdn-assets@11.9.0/highlight.min.js")
+            Script(
+                json.dumps(renderer_config(vendored=vendored)),
+                type="application/json",
+                id="pylogue-renderers",
+                data_worker=core_asset("pylogue-markdown-worker.js").url,
+            )
         )
-        headers.append(Script(src="/static/pylogue-markdown.js", type="module"))
+        headers.append(Script(src=core_asset("pylogue-markdown.js").url, type="module"))
 
-    headers.append(Link(rel="stylesheet", href="/static/pylogue-core.css"))
-    headers.append(Script(src="/static/pylogue-core.js", type="module"))
+    headers.append(Link(rel="stylesheet", href=core_asset("pylogue-core.css").url))
+    headers.append(Script(src=core_asset("pylogue-core.js").url, type="module"))
 
     return headers
 
 
+def _import_history(imported):
+    """`{"source", "start"}` of a payload holding only the newest cards of a stored chat, else None."""
+    history = imported.get("history") if isinstance(imported, dict) else None
+    if not isinstance(history, dict):
+        return None
+    source, start = history.get("source"), history.get("start")
+    if not isinstance(source, str) or not source or not isinstance(start, int) or start < 0:
+        return None
+    # Other keys (such as a signature for `history_access`) are kept for the app to check.
+    return {**history, "source": source, "start": start}
+
+
+def _normalize_imported_cards(imported):
+    """Normalize an export payload (or legacy role list) into `(cards, meta)`."""
+    meta = None
+    # Card ids are positions in the whole chat, so a partial payload continues the numbering.
+    first = (_import_history(imported) or {}).get("start", 0)
+    if isinstance(imported, dict):
+        meta = imported.get("meta")
+        imported = imported.get("cards", [])
+    normalized = []
+    if isinstance(imported, list):
+        if imported and all(isinstance(item, dict) and "role" in item for item in imported):
+            pending_question = None
+            for item in imported:
+                role = item.get("role")
+                content = item.get("content", "")
+                if role == "User":
+                    pending_question = content
+                elif role == "Assistant":
+                    if pending_question is None:
+                        continue
+                    normalized.append(
+                        {
+                            "id": str(first + len(normalized)),
+                            "question": pending_question,
+                            "answer": content,
+                            "answer_text": _normalize_answer_for_history(content),
+                        }
+                    )
+                    pending_question = None
+        else:
+            for item in imported:
+                if not isinstance(item, dict):
+                    continue
+                question = item.get("question")
+                answer = item.get("answer")
+                answer_text = item.get("answer_text")
+                if question is None or answer is None:
+                    continue
+                answer = str(answer)
+                if answer_text is None or (answer and not str(answer_text).strip()):
+                    answer_text = _normalize_answer_for_history(answer)
+                normalized.append(
+                    {
+                        "id": str(first + len(normalized)),
+                        "question": str(question),
+                        "answer": answer,
+                        "answer_text": str(answer_text),
+                    }
+                )
+    return normalized, meta
+
+
+class _ImportParser:
+    """Incremental parser for an export payload (`{"cards": [...], "meta": ...}` or a bare list).
+
+    `feed` returns the card items completed by the new text, so a large import
+    is decoded chunk by chunk instead of in one `json.loads`.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._in_object = False
+        self.meta = None
+        self.history = None
+
+    @property
+    def complete(self) -> bool:
+        return self._state == "end"
+
+    def feed(self, text: str) -> list:
+        self._buf = self._buf[self._pos :] + text
+        self._pos = 0
+        items = []
+        while self._state != "end" and self._step(items):
+            pass
+        return items
+
+    def _skip_ws(self) -> bool:
+        while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+            self._pos += 1
+        return self._pos < len(self._buf)
+
+    def _decode(self, pos: int):
+        # Returns (value, end), or None while the value may still be incomplete.
+        try:
+            value, end = self._decoder.raw_decode(self._buf, pos)
+        except json.JSONDecodeError:
+            return None
+        if end == len(self._buf):
+            if self._buf[end - 1] not in '"]}':
+                return None
+        elif self._buf[end] not in ",:]} \t\r\n":
+            return None
+        return value, end
+
+    def _step(self, items) -> bool:
+        if not self._skip_ws():
+            return False
+        char = self._buf[self._pos]
+        if self._state == "start":
+            if char not in "[{":
+                raise ValueError("Import payload must be a JSON object or array")
+            self._pos += 1
+            self._in_object = char == "{"
+            self._state = "object" if self._in_object else "items"
+            return True
+        if self._state == "items":
+            if char == ",":
+                self._pos += 1
+                return True
+            if char == "]":
+                self._pos += 1
+                self._state = "object" if self._in_object else "end"
+                return True
+            decoded = self._decode(self._pos)
+            if decoded is None:
+                return False
+            item, self._pos = decoded
+            items.append(item)
+            return True
+        # Top-level object: keys are decoded one by one; only "cards" is streamed.
+        if char == ",":
+            self._pos += 1
+            return True
+        if char == "}":
+            self._pos += 1
+            self._state = "end"
+            return True
+        decoded = self._decode(self._pos)
+        if decoded is None:
+            return False
+        key, pos = decoded
+        colon = self._buf.find(":", pos)
+        if colon == -1:
+            return False
+        value_pos = colon + 1
+        while value_pos < len(self._buf) and self._buf[value_pos] in " \t\r\n":
+            value_pos += 1
+        if value_pos >= len(self._buf):
+            return False
+        if key == "cards" and self._buf[value_pos] == "[":
+            self._pos = value_pos + 1
+            self._state = "items"
+            return True
+        decoded = self._decode(value_pos)
+        if decoded is None:
+            return False
+        value, self._pos = decoded
+        if key == "meta":
+            self.meta = value
+        elif key == "history":
+            self.history = value
+        return True
+
+
 def register_ws_routes(
     app,
     responder=None,
@@ -443,17 +1061,64 @@ def register_ws_routes(
     base_path: str = "",
     sessions: dict | None = None,
     auth_required: bool = False,
+    stream_deltas: bool = True,
+    flush_interval: float = 0.04,
+    flush_bytes: int = 4096,
+    send_queue_size: int = 64,
+    send_timeout: float = 10.0,
+    session_store: SessionStore | None = None,
+    resume_grace: float = 30.0,
+    idle_ttl: float | None = 900.0,
+    max_sessions: int | None = None,
+    max_session_bytes: int | None = None,
+    spill_store: SessionStore | None = None,
+    max_stored_sessions: int | None = 1024,
+    max_import_bytes: int = 32 * 1024 * 1024,
+    import_render_batch: int = 50,
+    executor=None,
+    offload_min_bytes: int | None = 256 * 1024,
+    loop_lag_interval: float | None = 0.5,
+    forward_poll_interval: float = 0.25,
+    drain_timeout: float | None = 25.0,
+    history_loader=None,
+    history_access=None,
 ):
+    """Register the chat WebSocket plus its export and embed routes; returns the sessions dict.
+
+    `history_loader(source, start, end)` returns the stored cards `[start:end]` of chat `source`.
+    It serves older turns of imports that carry only the newest cards
+    (`{"cards": [...], "history": {"source": ..., "start": ...}}`). The import comes from the
+    client, so `history_access(history, context)` must confirm that the session's user may read
+    `history["source"]` before any older turns are loaded.
+    """
+    if history_loader is not None and history_access is None:
+        raise ValueError("history_loader needs history_access to check the client's history source")
     if responder_factory is None:
         responder = responder or EchoResponder()
+        _responder_adapter(responder)
     base_path = _normalize_base_path(base_path)
     ws_path = f"{base_path}/ws" if base_path else "/ws"
+    export_path = f"{base_path}/export" if base_path else "/export"
+    embeds_path = f"{base_path}{EMBED_PATH}"
     if sessions is None:
         sessions = {}
-
-    def _on_connect(ws, send):
-        if auth_required and not _connection_auth(ws):
-            return
+    if session_store is None:
+        # `pylogue serve` exports PYLOGUE_SESSION_STORE so every worker shares one store.
+        session_store = session_store_from_url(os.getenv("PYLOGUE_SESSION_STORE"))
+        if isinstance(session_store, InMemorySessionStore):
+            session_store.max_entries = max_stored_sessions
+    if spill_store is None:
+        # Spilling is opt-in: an in-memory session store is not a spill target (see `_hibernate`).
+        spill_store = session_store
+    # Store and history I/O touches objects a process pool cannot pickle; only a thread pool can take it.
+    io_executor = executor if isinstance(executor, concurrent.futures.ThreadPoolExecutor) else None
+    # Sessions whose socket dropped mid-answer, keyed by session id, kept for `resume_grace` seconds.
+    detached: dict[str, dict] = {}
+    sweeper = None
+    lag_monitor = None
+    draining = False
+
+    def _new_session(ws, send):
         session_context = _build_responder_context(ws)
         session_responder = responder_factory() if responder_factory else responder
         if hasattr(session_responder, "set_context"):
@@ -461,22 +1126,596 @@ def register_ws_routes(
                 session_responder.set_context(session_context)
             except Exception:
                 pass
-        ws_id = id(ws)
-        sessions[ws_id] = {
+        return {
+            "id": secrets.token_urlsafe(16),
             "cards": [],
             "responder": session_responder,
+            "adapter": _responder_adapter(session_responder),
             "task": None,
             "context": session_context,
+            "last_active": time.monotonic(),
+            "bytes": 0,
+            "hibernated": False,
+            "writer": _StoreWriter(io_executor),
+            "outbox": _SessionOutbox(
+                send,
+                close=ws.close,
+                max_size=send_queue_size,
+                send_timeout=send_timeout,
+            ),
         }
 
-    def _on_disconnect(ws):
-        session = sessions.pop(id(ws), None)
+    def _session_owner(session):
+        user = (session.get("context") or {}).get("user") or {}
+        return user.get("email")
+
+    def _session_frame(session):
+        return render_control_frame("session", id=session["id"], export=export_path, embeds=embeds_path)
+
+    def _send(session, message, **kwargs):
+        outbox = session.get("outbox")
+        if outbox is not None:
+            outbox.put(message, **kwargs)
+
+    def _snapshot(session):
+        # What a store write needs, taken on the loop: the write runs later on a thread, after
+        # more chunks may have landed, so the card still streaming is copied as it is now.
+        stream = session.get("stream") or {}
+        live_id = None if stream.get("done") else stream.get("card_id")
+        return {
+            "id": session["id"],
+            "cards": [dict(c) if c.get("id") == live_id else c for c in session["cards"]],
+            "responder": session["responder"],
+            "history": session.get("history"),
+            "owner": _session_owner(session),
+            "stream": dict(stream) if stream else None,
+        }
+
+    def _put_session(snapshot, store=None):
+        payload = build_export_payload(
+            snapshot["cards"], responder=snapshot["responder"], history=snapshot["history"]
+        )
+        if snapshot["owner"]:
+            payload["owner"] = snapshot["owner"]
+        if snapshot["stream"]:
+            payload["stream"] = snapshot["stream"]
+        try:
+            (store or session_store).put(snapshot["id"], payload)
+            return True
+        except Exception:
+            _LOG.exception("Failed to persist session %s", snapshot["id"])
+            return False
+
+    def _put_card(snapshot, card):
+        payload = build_export_payload([card], responder=snapshot["responder"], history=snapshot["history"])
+        fields = {
+            "meta": payload.get("meta"),
+            "history": payload.get("history"),
+            "owner": snapshot["owner"],
+            "stream": snapshot["stream"],
+        }
+        try:
+            if session_store.put_card(snapshot["id"], payload["cards"][0], fields):
+                return True
+        except Exception:
+            _LOG.exception("Failed to persist a card of session %s", snapshot["id"])
+            return False
+        # Not stored yet (or evicted): write the whole conversation once.
+        return _put_session(snapshot)
+
+    def _persist(session, store=None) -> asyncio.Future:
+        """Write the whole conversation; only imports, hibernation and drain need this."""
+        return session["writer"].submit(_put_session, _snapshot(session), store)
+
+    def _persist_card(session, card) -> asyncio.Future:
+        """Write one turn: the card plus the small top-level fields."""
+        snapshot = _snapshot(session)
+        return session["writer"].submit(_put_card, snapshot, dict(card))
+
+    def _stores():
+        if spill_store is session_store:
+            return (session_store,)
+        return (session_store, spill_store)
+
+    def _read_stored(session_id):
+        for store in _stores():
+            try:
+                stored = store.get(session_id)
+            except Exception:
+                _LOG.exception("Failed to load session %s", session_id)
+                stored = None
+            if stored is not None:
+                return stored
+        return None
+
+    async def _load_stored(session_id):
+        return await asyncio.get_running_loop().run_in_executor(io_executor, _read_stored, session_id)
+
+    def _expire_in(store, session_id, ttl):
+        try:
+            store.expire(session_id, ttl)
+        except Exception:
+            _LOG.exception("Failed to expire session %s", session_id)
+
+    def _expire_stored(session):
+        """Nobody is attached any more: keep the stored copy only long enough for a reconnect."""
+        # While draining, browsers reconnect to another worker and resume from the store.
+        grace = max(resume_grace, drain_timeout or 0) if draining else resume_grace
+        for store in _stores():
+            session["writer"].submit(_expire_in, store, session["id"], grace)
+        # Finished cards hold their HTML inline; the references only served the live page.
+        for token in session.pop("embeds", ()):
+            session["writer"].submit(take_html, token)
+
+    def _busy(session) -> bool:
+        task = session.get("task")
+        return task is not None and not task.done()
+
+    async def _hibernate(session):
+        """Spill an idle session's cards and drop its responder; the socket stays open."""
+        if session["hibernated"] or session.get("hibernating") or _busy(session):
+            return False
+        target = spill_store
+        if isinstance(target, InMemorySessionStore):
+            # Spilling would only move the cards within this process's memory; keep them.
+            return False
+        active = session["last_active"]
+        session["hibernating"] = True
+        try:
+            spilled = await _persist(session, store=target)
+        finally:
+            session["hibernating"] = False
+        # A message that arrived during the write keeps the session awake.
+        if not spilled or session["last_active"] != active or _busy(session):
+            return False
+        if target is not session_store and isinstance(session_store, InMemorySessionStore):
+            # The spilled copy is the one to load from; free the in-memory one.
+            session["writer"].submit(_expire_in, session_store, session["id"], 0)
+        session["cards"] = []
+        session["bytes"] = 0
+        session["hibernated"] = True
+        if responder_factory:
+            session["responder"] = None
+        _METRICS["sessions_hibernated"] += 1
+        return True
+
+    async def _rehydrate(session):
+        stored = await _load_stored(session["id"])
+        if session["responder"] is None:
+            session["responder"] = responder_factory()
+            if hasattr(session["responder"], "set_context"):
+                try:
+                    session["responder"].set_context(session.get("context"))
+                except Exception:
+                    pass
+            session["adapter"] = _responder_adapter(session["responder"])
+        session["hibernated"] = False
+        _METRICS["sessions_rehydrated"] += 1
+        if stored is None:
+            _load_cards(session, [])
+            return
+        restored, meta = _normalize_imported_cards(stored)
+        _load_cards(session, restored, meta, render=False, history=_import_history(stored))
+
+    async def _enforce_session_budget():
+        now = time.monotonic()
+        awake = [session for session in sessions.values() if not session["hibernated"]]
+        if idle_ttl is not None:
+            for session in awake:
+                if now - session["last_active"] > idle_ttl:
+                    await _hibernate(session)
+            awake = [session for session in awake if not session["hibernated"]]
+        over_count = max_sessions is not None and len(awake) > max_sessions
+        total_bytes = sum(session["bytes"] for session in awake)
+        over_bytes = max_session_bytes is not None and total_bytes > max_session_bytes
+        if not (over_count or over_bytes):
+            return
+        awake.sort(key=lambda session: session["last_active"])
+        count = len(awake)
+        for session in awake:
+            within_count = max_sessions is None or count <= max_sessions
+            within_bytes = max_session_bytes is None or total_bytes <= max_session_bytes
+            if within_count and within_bytes:
+                break
+            size = session["bytes"]
+            if await _hibernate(session):
+                count -= 1
+                total_bytes -= size
+
+    async def _sweep_sessions():
+        interval = min(idle_ttl / 4, 30.0) if idle_ttl else 30.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await _enforce_session_budget()
+            except Exception:
+                _LOG.exception("Session sweep failed")
+
+    def _ensure_sweeper():
+        nonlocal sweeper
+        if idle_ttl is None and max_sessions is None and max_session_bytes is None:
+            return
+        loop = asyncio.get_running_loop()
+        if sweeper is None or sweeper.done() or sweeper.get_loop() is not loop:
+            sweeper = loop.create_task(_sweep_sessions())
+
+    def _ensure_lag_monitor():
+        nonlocal lag_monitor
+        if not loop_lag_interval:
+            return
+        loop = asyncio.get_running_loop()
+        if lag_monitor is None or lag_monitor.done() or lag_monitor.get_loop() is not loop:
+            lag_monitor = loop.create_task(_monitor_loop_lag(loop_lag_interval))
+
+    def _should_offload(size) -> bool:
+        return offload_min_bytes is not None and size >= offload_min_bytes
+
+    def _offload(func, *args):
+        """Run CPU-heavy `func(*args)` on `executor` (the loop's default thread pool when None)."""
+        _METRICS["offloaded_tasks"] += 1
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(executor, functools.partial(func, *args))
+
+    def _append_chunk(session, card_id, text):
+        session["writer"].append_chunk(session_store, session["id"], card_id, text)
+
+    def _cards_bytes(cards):
+        return sum(len(c.get("question") or "") + len(c.get("answer") or "") for c in cards)
+
+    def _history_start(session) -> int:
+        # Index of session["cards"][0] in the whole chat (non-zero after a partial import).
+        return (session.get("history") or {}).get("start", 0)
+
+    def _render_all(session):
+        """Show the newest `import_render_batch` cards; older pages are sent on OLDER_PREFIX requests."""
+        cards = session["cards"]
+        start = max(0, len(cards) - max(1, import_render_batch))
+        recent = list(cards[start:])
+        first = _history_start(session) + start
+        if _should_offload(_cards_bytes(recent)):
+            _send(session, _offload(_render_cards_html, recent, first))
+        else:
+            _send(session, render_cards(recent, start=first))
+
+    async def _load_older(session, start, before):
+        history = session.get("history") or {}
+        if history_loader is None or not history.get("source"):
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            # The reference arrived with a client import; check it on every read, since the
+            # session may have been restored from the store by a worker that never saw the import.
+            if not await loop.run_in_executor(io_executor, history_access, history, session.get("context")):
+                _LOG.warning("history_access refused older cards for session %s", session["id"])
+                return None
+            items = await loop.run_in_executor(io_executor, history_loader, history["source"], start, before)
+        except Exception:
+            _LOG.exception("Failed to load older cards for session %s", session["id"])
+            return None
+        page, _ = _normalize_imported_cards({"cards": items or [], "history": {**history, "start": start}})
+        return page
+
+    async def _render_older(session, before):
+        cards = session["cards"]
+        offset = _history_start(session)
+        before = min(max(0, before), offset + len(cards))
+        if not before:
+            return
+        start = max(0, before - max(1, import_render_batch))
+        if before > offset:
+            start = max(start, offset)
+            page = list(cards[start - offset : before - offset])
+        else:
+            # Turns before the imported window come from the chat's own storage.
+            page = await _load_older(session, start, before)
+            if page is None:
+                _send(session, _render_older_marker(0, oob=True))
+                return
+        if _should_offload(_cards_bytes(page)):
+            _send(session, _offload(_render_cards_prepend_html, page, start))
+        else:
+            _send(session, render_cards_prepend(page, start=start))
+
+    def _load_cards(session, cards, meta=None, render: bool = True, history=None):
+        session_responder = session["responder"]
+        session["cards"] = cards
+        session["history"] = history
+        session["bytes"] = _cards_bytes(cards)
+        if meta is not None and hasattr(session_responder, "load_state"):
+            try:
+                session_responder.load_state(meta)
+            except Exception:
+                pass
+        if hasattr(session_responder, "load_history"):
+            try:
+                session_responder.load_history(cards, context=session.get("context"))
+            except Exception:
+                pass
+        if render:
+            _render_all(session)
+
+    def _import_frame(import_id, state, **data):
+        return render_control_frame("import", id=import_id, state=state, **data)
+
+    def _start_import(session):
+        task = session.get("task")
+        if task is not None and not task.done():
+            task.cancel()
+
+    async def _finish_import(session, imported, import_id="", size=0):
+        if _should_offload(size):
+            normalized, meta = await _offload(_normalize_imported_cards, imported)
+        else:
+            normalized, meta = _normalize_imported_cards(imported)
+        session["stream"] = None
+        _load_cards(session, normalized, meta, history=_import_history(imported))
+        await _persist(session)
+        _send(session, _import_frame(import_id, "done", cards=len(normalized)))
+
+    def _abort_import(session, import_id, reason):
+        # Remember the id so the rest of its slices are dropped without more error frames.
+        session["import"] = {"id": import_id, "failed": True}
+        _send(session, _import_frame(import_id, "error", reason=reason))
+
+    async def _receive_import_chunk(session, message: str):
+        """Handle one `IMPORT_CHUNK_PREFIX` frame: `{"id", "seq", "final"}` header, newline, payload slice."""
+        header, _, data = message.partition("\n")
+        try:
+            header = json.loads(header)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(header, dict):
+            return
+        import_id = str(header.get("id") or "")
+        state = session.get("import")
+        if header.get("seq") == 0:
+            _start_import(session)
+            state = {"id": import_id, "seq": 0, "bytes": 0, "items": [], "parser": _ImportParser()}
+            session["import"] = state
+        if state is not None and state["id"] == import_id and state.get("failed"):
+            return
+        if state is None or state["id"] != import_id or header.get("seq") != state["seq"]:
+            _abort_import(session, import_id, "out of order")
+            return
+        state["seq"] += 1
+        state["bytes"] += len(data.encode("utf-8"))
+        if state["bytes"] > max_import_bytes:
+            _abort_import(session, import_id, "too large")
+            return
+        try:
+            state["items"].extend(state["parser"].feed(data))
+        except ValueError:
+            _abort_import(session, import_id, "invalid")
+            return
+        if not header.get("final"):
+            progress = _import_frame(import_id, "receiving", bytes=state["bytes"], cards=len(state["items"]))
+            # Progress frames collapse into the latest one when the client falls behind.
+            _send(session, progress, key=f"import-{import_id}", snapshot=lambda: progress)
+            return
+        session["import"] = None
+        if not state["parser"].complete:
+            _send(session, _import_frame(import_id, "error", reason="invalid"))
+            return
+        imported = {"cards": state["items"], "meta": state["parser"].meta, "history": state["parser"].history}
+        await _finish_import(session, imported, import_id, size=state["bytes"])
+
+    def _send_stream_tail(session, stream_id, offset) -> bool:
+        """Replay the part of the last stream the client has not seen yet."""
+        stream = session.get("stream") or {}
+        if not stream_id or stream.get("id") != stream_id:
+            return False
+        if not isinstance(offset, int) or offset < 0:
+            return False
+        card = next((c for c in session["cards"] if c.get("id") == stream.get("card_id")), None)
+        if card is None:
+            return False
+        data = (card.get("answer") or "").encode("utf-8")
+        if offset > len(data) or stream.get("inlined"):
+            # An inlined answer no longer matches the bytes the client counted.
+            return False
+        tail = data[offset:].decode("utf-8", errors="ignore")
+        if tail:
+            _send(session, render_assistant_delta(card, tail, offset, stream_id=stream_id))
+        if stream.get("done"):
+            _send(session, render_control_frame("done", card=card["id"], stream=stream_id))
+        return True
+
+    async def _forward_remote_stream(session, card):
+        """Follow an answer still streaming on another worker by polling the shared store."""
+        stream_id = session["stream"]["id"]
+        offset = len((card.get("answer") or "").encode("utf-8"))
+        loop = asyncio.get_running_loop()
+        # The owning worker stops a detached stream after `resume_grace`; give up a little later.
+        deadline = loop.time() + max(resume_grace, forward_poll_interval) + 5
+        while loop.time() < deadline:
+            await asyncio.sleep(forward_poll_interval)
+            stored = await _load_stored(session["id"])
+            stream = (stored or {}).get("stream") or {}
+            if stream.get("id") != stream_id:
+                break
+            remote = next((c for c in stored.get("cards", []) if c.get("id") == card["id"]), None)
+            answer = (remote or {}).get("answer") or ""
+            data = answer.encode("utf-8")
+            if len(data) > offset:
+                card["answer"] = answer
+                _send(
+                    session,
+                    render_assistant_delta(card, data[offset:].decode("utf-8", errors="ignore"), offset, stream_id),
+                )
+                offset = len(data)
+            if stream.get("done"):
+                session["stream"] = stream
+                restored, meta = _normalize_imported_cards(stored)
+                _load_cards(session, restored, meta, render=False, history=_import_history(stored))
+                break
+        _send(session, render_control_frame("done", card=card["id"], stream=stream_id))
+
+    def _expire_detached(session_id):
+        session = detached.pop(session_id, None)
         if session is None:
             return
         task = session.get("task")
         if task is not None and not task.done():
             task.cancel()
 
+    async def _on_connect(ws, send):
+        if auth_required and not _connection_auth(ws):
+            return
+        session = _new_session(ws, send)
+        sessions[id(ws)] = session
+        session["outbox"].put(_session_frame(session))
+        _ensure_sweeper()
+        _ensure_lag_monitor()
+        if max_sessions is not None and len(sessions) > max_sessions:
+            await _enforce_session_budget()
+
+    async def _on_disconnect(ws):
+        session = sessions.pop(id(ws), None)
+        if session is None:
+            return
+        session["outbox"].close()
+        session["outbox"] = None
+        task = session.get("task")
+        if task is None or task.done():
+            _expire_stored(session)
+            return
+        if resume_grace <= 0 and not draining:
+            task.cancel()
+            return
+        # Keep generating into the replay buffer so a reconnect can pick the stream back up.
+        # While draining (the server closes sockets with 1012 on shutdown) the drain deadline applies instead.
+        detached[session["id"]] = session
+        grace = max(resume_grace, drain_timeout or 0) if draining else resume_grace
+        session["grace"] = asyncio.get_running_loop().call_later(grace, _expire_detached, session["id"])
+
+    async def drain(timeout: float | None = None):
+        """Stop taking prompts, let running answers finish, persist everything and send clients elsewhere.
+
+        Answers still running after `timeout` (default `drain_timeout`) are stopped and
+        persisted as they are. Connected browsers are closed with 1012 so the ws extension
+        reconnects (through the load balancer) and resumes from the session store.
+        """
+        nonlocal draining
+        if draining:
+            # Already drained, e.g. by `pylogue serve` before the lifespan shutdown hook runs.
+            return
+        draining = True
+        timeout = drain_timeout if timeout is None else timeout
+        for session in detached.values():
+            # The drain deadline replaces the resume grace timer.
+            session["grace"].cancel()
+            session["grace"] = asyncio.get_running_loop().call_later(
+                max(resume_grace, timeout or 0) + 5, _expire_detached, session["id"]
+            )
+        for session in list(sessions.values()):
+            _send(session, render_control_frame("draining"))
+        live = list(sessions.values()) + list(detached.values())
+        tasks = [
+            session["task"]
+            for session in live
+            if session.get("task") is not None and not session["task"].done()
+        ]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Cancelled answers append "[Stopped]" and persist in their own finally blocks.
+                await asyncio.wait(pending, timeout=5.0)
+        # Every turn queued its card write as it ended; wait for the writers to finish.
+        await asyncio.gather(*(session["writer"].flush() for session in live), return_exceptions=True)
+        closing = [s["outbox"].close_after_flush(1012) for s in list(sessions.values()) if s.get("outbox")]
+        if closing:
+            await asyncio.gather(*closing, return_exceptions=True)
+
+    if not hasattr(app.state, "pylogue_drains"):
+        app.state.pylogue_drains = []
+    app.state.pylogue_drains.append(drain)
+    if drain_timeout is not None and not _on_app_shutdown(app, drain):
+        _LOG.warning("Could not hook pylogue drain into app shutdown; call drain_app(app) yourself.")
+
+    @app.route(export_path, methods=["GET"])
+    async def pylogue_export(request: Request):
+        """Export payload for one session, built on demand for the download button and history apps.
+
+        With `card=<id>` only that card is exported, so a history app can save one finished turn.
+        """
+        auth = _request_auth(request)
+        if auth_required and not auth:
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        owner = (_user_context_from_auth(auth) or {}).get("email")
+        session_id = request.query_params.get("session") or ""
+        card_id = request.query_params.get("card")
+        session = next((s for s in sessions.values() if s["id"] == session_id), None)
+        session = session or detached.get(session_id)
+        if session is not None and not session["hibernated"]:
+            if _session_owner(session) and _session_owner(session) != owner:
+                return JSONResponse({"error": "Not found"}, status_code=404)
+            history = session.get("history")
+            cards = list(session["cards"])
+            size = session["bytes"]
+            if card_id is not None:
+                cards = [card for card in cards if card.get("id") == card_id]
+                if not cards:
+                    return JSONResponse({"error": "Not found"}, status_code=404)
+                history = None
+                size = _cards_bytes(cards)
+            meta = build_export_payload([], responder=session["responder"]).get("meta")
+            # Inline /embeds HTML here, on a thread: the lookups may hit SQLite or Redis, and a
+            # process-pool offload below would not see this process's in-memory embed store.
+            cards = await asyncio.get_running_loop().run_in_executor(io_executor, _inline_embeds, cards)
+            if _should_offload(size):
+                body = await _offload(_export_json, cards, meta, history)
+            else:
+                body = _export_json(cards, meta, history)
+            return Response(body, media_type="application/json")
+        stored = await _load_stored(session_id) if session_id else None
+        if stored is None or (stored.get("owner") and stored.get("owner") != owner):
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        stored.pop("owner", None)
+        stored.pop("stream", None)
+        if card_id is not None:
+            stored["cards"] = [card for card in stored.get("cards", []) if card.get("id") == card_id]
+            if not stored["cards"]:
+                return JSONResponse({"error": "Not found"}, status_code=404)
+            stored.pop("history", None)
+        return JSONResponse(stored)
+
+    @app.route(f"{embeds_path}/{{token}}", methods=["GET"])
+    async def pylogue_embed(request: Request, token: str):
+        """Tool HTML referenced by a `data-embed` placeholder in the `session=` conversation."""
+        auth = _request_auth(request)
+        if auth_required and not auth:
+            return Response("Unauthorized", status_code=401)
+        owner = (_user_context_from_auth(auth) or {}).get("email")
+        session_id = request.query_params.get("session") or ""
+        # Tokens are content hashes, so anyone could compute one; serve it only to the session that streamed it.
+        session = next((s for s in sessions.values() if s["id"] == session_id), None)
+        session = session or detached.get(session_id)
+        if session is not None:
+            allowed = (not _session_owner(session) or _session_owner(session) == owner) and (
+                token in session.get("embeds", ()) or _references_embed(session["cards"], token)
+            )
+        else:
+            stored = await _load_stored(session_id) if session_id else None
+            allowed = (
+                stored is not None
+                and (not stored.get("owner") or stored.get("owner") == owner)
+                and _references_embed(stored.get("cards", []), token)
+            )
+        if not allowed:
+            return Response("Not found", status_code=404, headers={"Cache-Control": "no-store"})
+        body = await asyncio.get_running_loop().run_in_executor(None, get_html, token)
+        if body is None:
+            return Response("Not found", status_code=404, headers={"Cache-Control": "no-store"})
+        # The body never changes, but the token expires with the store's TTL, so no `immutable`.
+        max_age = int(getattr(get_embed_store(), "ttl", 0) or 0)
+        return Response(
+            body,
+            media_type="text/html",
+            headers={"Cache-Control": f"private, max-age={max_age}"},
+        )
+
     @app.ws(ws_path, conn=_on_connect, disconn=_on_disconnect)
     async def ws_handler(msg: str, send, ws):
         if auth_required and not _connection_auth(ws):
@@ -484,22 +1723,14 @@ def register_ws_routes(
         ws_id = id(ws)
         session = sessions.get(ws_id)
         if session is None:
-            session_context = _build_responder_context(ws)
-            session_responder = responder_factory() if responder_factory else responder
-            if hasattr(session_responder, "set_context"):
-                try:
-                    session_responder.set_context(session_context)
-                except Exception:
-                    pass
-            session = {
-                "cards": [],
-                "responder": session_responder,
-                "task": None,
-                "context": session_context,
-            }
+            session = _new_session(ws, send)
             sessions[ws_id] = session
+        session["last_active"] = time.monotonic()
+        if session["hibernated"]:
+            await _rehydrate(session)
         cards = session["cards"]
         session_responder = session["responder"]
+        outbox = session["outbox"]
         current_task = session.get("task")
         context = _build_responder_context(ws)
         if context is not None:
@@ -511,99 +1742,150 @@ def register_ws_routes(
                     pass
 
         async def _run_message(prompt: str):
-            cards.append({"id": str(len(cards)), "question": prompt, "answer": ""})
-            await send(render_cards(cards))
+            cards.append({"id": str(_history_start(session) + len(cards)), "question": prompt, "answer": ""})
+            card = cards[-1]
+            session["bytes"] += len(prompt)
+            stream = {"id": secrets.token_urlsafe(8), "card_id": card["id"], "done": False}
+            session["stream"] = stream
+            update_key = f"assistant-{card['id']}"
+            sent_bytes = 0
+            _send(session, render_card_append(card))
+
+            async def _flush(text: str):
+                nonlocal sent_bytes
+                card["answer"] += text
+                session["bytes"] += len(text)
+                session["last_active"] = time.monotonic()
+                _append_chunk(session, card["id"], text)
+                if stream_deltas:
+                    _send(
+                        session,
+                        render_assistant_delta(card, text, sent_bytes, stream_id=stream["id"]),
+                        key=update_key,
+                        snapshot=lambda: render_assistant_update(card),
+                    )
+                    sent_bytes += len(text.encode("utf-8"))
+                else:
+                    _send(
+                        session,
+                        lambda: render_assistant_update(card),
+                        key=update_key,
+                        snapshot=lambda: render_assistant_update(card),
+                    )
+
+            coalescer = _ChunkCoalescer(_flush, interval=flush_interval, max_bytes=flush_bytes)
+
+            # Queued, not awaited: the writer keeps it ahead of this turn's chunks.
+            _persist_card(session, card)
             try:
-                result = _invoke_responder(
-                    session_responder,
-                    prompt,
-                    context=session.get("context"),
-                )
-                if inspect.isasyncgen(result):
+                adapter = session["adapter"]
+                result = adapter(session_responder, prompt, session.get("context"))
+                if adapter.kind == "sync" and inspect.isasyncgen(result):
+                    adapter = _ResponderAdapter("asyncgen", adapter.context)
+                if adapter.kind == "asyncgen":
                     async for chunk in result:
-                        cards[-1]["answer"] += str(chunk)
-                        await send(render_assistant_update(cards[-1]))
+                        await coalescer.add(str(chunk))
                 else:
-                    if inspect.isawaitable(result):
+                    if adapter.kind == "coroutine" or inspect.isawaitable(result):
                         result = await result
                     for ch in str(result):
-                        cards[-1]["answer"] += ch
-                        await send(render_assistant_update(cards[-1]))
+                        await coalescer.add(ch)
             except asyncio.CancelledError:
-                if cards and cards[-1].get("answer"):
-                    cards[-1]["answer"] += "\n\n[Stopped]"
-                else:
-                    cards[-1]["answer"] = "[Stopped]"
-                await send(render_assistant_update(cards[-1]))
+                await coalescer.flush()
+                await coalescer.add("\n\n[Stopped]" if card.get("answer") else "[Stopped]")
             finally:
-                await send(render_chat_data(cards))
-                await send(render_chat_export(cards, responder=session_responder))
+                await coalescer.flush()
+                if 'data-embed="' in card["answer"]:
+                    # Live cards outlive the embed TTL (older pages, RESYNC, RESUME), so the
+                    # finished card keeps the HTML itself; the references go with the session.
+                    answer, tokens = await asyncio.get_running_loop().run_in_executor(
+                        io_executor, _resolve_answer_embeds, card["answer"]
+                    )
+                    session["embeds"] = session.get("embeds", []) + tokens
+                    session["bytes"] += len(answer) - len(card["answer"])
+                    card["answer"] = answer
+                    stream["inlined"] = True
+                card["answer_text"] = _normalize_answer_for_history(card["answer"])
+                stream["done"] = True
+                _send(session, render_control_frame("done", card=card["id"], stream=stream["id"]))
+                _persist_card(session, card)
                 session["task"] = None
+                if detached.get(session["id"]) is session:
+                    detached.pop(session["id"], None)
+                    session.pop("grace").cancel()
+                if session.get("outbox") is None:
+                    # The socket closed while this answer ran and nobody re-attached.
+                    _expire_stored(session)
+            return
+
+        if isinstance(msg, str) and msg.startswith(IMPORT_CHUNK_PREFIX):
+            await _receive_import_chunk(session, msg[len(IMPORT_CHUNK_PREFIX) :])
             return
 
         if isinstance(msg, str) and msg.startswith(IMPORT_PREFIX):
-            if current_task is not None and not current_task.done():
-                current_task.cancel()
+            # Single-frame import; large histories should use IMPORT_CHUNK_PREFIX.
+            _start_import(session)
+            session["import"] = None
             payload = msg[len(IMPORT_PREFIX) :].strip()
+            if len(payload) > max_import_bytes:
+                _send(session, _import_frame("", "error", reason="too large"))
+                return
             try:
-                imported = json.loads(payload) if payload else []
+                if _should_offload(len(payload)):
+                    imported = await _offload(json.loads, payload)
+                else:
+                    imported = json.loads(payload) if payload else []
             except json.JSONDecodeError:
                 imported = []
-            meta = None
-            if isinstance(imported, dict):
-                meta = imported.get("meta")
-                imported = imported.get("cards", [])
-            normalized = []
-            if isinstance(imported, list):
-                if imported and all(isinstance(item, dict) and "role" in item for item in imported):
-                    pending_question = None
-                    for item in imported:
-                        role = item.get("role")
-                        content = item.get("content", "")
-                        if role == "User":
-                            pending_question = content
-                        elif role == "Assistant":
-                            if pending_question is None:
-                                continue
-                            normalized.append(
-                                {
-                                    "id": str(len(normalized)),
-                                    "question": pending_question,
-                                    "answer": content,
-                                }
-                            )
-                            pending_question = None
-                else:
-                    for item in imported:
-                        if not isinstance(item, dict):
-                            continue
-                        question = item.get("question")
-                        answer = item.get("answer")
-                        answer_text = item.get("answer_text")
-                        if question is None or answer is None:
-                            continue
-                        normalized.append(
-                            {
-                                "id": str(len(normalized)),
-                                "question": str(question),
-                                "answer": str(answer),
-                                "answer_text": str(answer_text) if answer_text is not None else None,
-                            }
-                        )
-            session["cards"] = normalized
-            if meta is not None and hasattr(session_responder, "load_state"):
-                try:
-                    session_responder.load_state(meta)
-                except Exception:
-                    pass
-            if hasattr(session_responder, "load_history"):
-                try:
-                    session_responder.load_history(normalized, context=session.get("context"))
-                except Exception:
-                    pass
-            await send(render_cards(normalized))
-            await send(render_chat_data(normalized))
-            await send(render_chat_export(normalized, responder=session_responder))
+            await _finish_import(session, imported, size=len(payload))
+            return
+
+        if isinstance(msg, str) and msg.startswith(RESUME_PREFIX):
+            # Reconnected client (possibly on another worker) asks for its conversation back.
+            try:
+                request = json.loads(msg[len(RESUME_PREFIX) :] or "{}")
+            except json.JSONDecodeError:
+                request = {}
+            if not isinstance(request, dict):
+                request = {}
+            resume_id = request.get("session")
+            stream_id = request.get("stream")
+            offset = request.get("offset")
+            if not resume_id or resume_id == session["id"]:
+                return
+            live = detached.get(str(resume_id))
+            if live is not None and _session_owner(live) == _session_owner(session):
+                # The answer is still streaming in this process: re-attach it to the new socket.
+                detached.pop(str(resume_id), None)
+                live.pop("grace").cancel()
+                if current_task is not None and not current_task.done():
+                    current_task.cancel()
+                live["outbox"] = outbox
+                live["context"] = session.get("context")
+                sessions[ws_id] = live
+                _send(live, _session_frame(live))
+                if not _send_stream_tail(live, stream_id, offset):
+                    _render_all(live)
+                return
+            stored = await _load_stored(str(resume_id))
+            if stored is None:
+                return
+            if stored.get("owner") and stored.get("owner") != _session_owner(session):
+                return
+            if current_task is not None and not current_task.done():
+                current_task.cancel()
+            session["id"] = str(resume_id)
+            session["stream"] = stored.get("stream") if isinstance(stored.get("stream"), dict) else None
+            _send(session, _session_frame(session))
+            restored, meta = _normalize_imported_cards(stored)
+            _load_cards(session, restored, meta, render=False, history=_import_history(stored))
+            if not _send_stream_tail(session, stream_id, offset):
+                _render_all(session)
+            stream = session["stream"] or {}
+            card = next((c for c in session["cards"] if c.get("id") == stream.get("card_id")), None)
+            if card is not None and not stream.get("done"):
+                # Another worker still owns this answer: keep relaying it from the store.
+                session["task"] = asyncio.create_task(_forward_remote_stream(session, card))
             return
 
         if isinstance(msg, str) and msg.startswith(STOP_PREFIX):
@@ -611,6 +1893,30 @@ def register_ws_routes(
                 current_task.cancel()
             return
 
+        if isinstance(msg, str) and msg.startswith(RESYNC_PREFIX):
+            # Client saw a gap in the delta stream; fall back to a full replace.
+            card_id = msg[len(RESYNC_PREFIX) :].strip()
+            for card in cards:
+                if card.get("id") == card_id:
+                    _send(session, render_assistant_update(card))
+                    break
+            return
+
+        if isinstance(msg, str) and msg.startswith(OLDER_PREFIX):
+            # The client scrolled up to #cards-older; send the page of cards before that index.
+            try:
+                before = int(msg[len(OLDER_PREFIX) :].strip())
+            except ValueError:
+                return
+            await _render_older(session, before)
+            return
+
+        if draining:
+            # Hand the prompt back; pylogue-core.js replays it after reconnecting to another worker.
+            prompt_b64 = base64.b64encode(str(msg).encode("utf-8")).decode("ascii")
+            _send(session, render_control_frame("draining", prompt_b64=prompt_b64))
+            return
+
         if current_task is not None and not current_task.done():
             current_task.cancel()
 
@@ -633,6 +1939,7 @@ def register_routes(
     tag_line_href: str = "",
     google_oauth_config: GoogleOAuthConfig | None = None,
     auth_required: bool | None = None,
+    session_store: SessionStore | None = None,
 ):
     if responder_factory is None and responder is not None and hasattr(responder, "message_history"):
         raise ValueError(
@@ -665,6 +1972,7 @@ def register_routes(
         responder_factory=responder_factory,
         base_path=base_path,
         auth_required=auth_required,
+        session_store=session_store,
     )
 
     @app.route(chat_path)
@@ -768,6 +2076,7 @@ def main(
     tag_line_href: str = "",
     google_oauth_config: GoogleOAuthConfig | None = None,
     auth_required: bool | None = None,
+    session_store: SessionStore | None = None,
 ):
     if responder is None:
         responder = EchoResponder()
@@ -794,6 +2103,7 @@ def main(
         base_path="",
         google_oauth_config=oauth_cfg,
         auth_required=auth_required,
+        session_store=session_store,
     )
     return app
 
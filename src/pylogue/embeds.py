@@ -1,32 +1,330 @@
-import secrets
+import base64
+import hashlib
+import html as html_lib
+import os
+import re
+import sqlite3
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Protocol
 
-_HTML_CACHE: dict[str, tuple[float, str]] = {}
 _TTL_SECONDS = 60 * 10
+_MAX_ENTRIES = 1024
+_MAX_BYTES = 64 * 1024 * 1024
+EMBED_PATH = "/embeds"
+_PLACEHOLDER_RE = re.compile(r'<div class="tool-html" data-embed="([^"]*)"></div>')
 
 
-def _purge_expired(now: float) -> None:
-    expired = [key for key, (ts, _) in _HTML_CACHE.items() if now - ts > _TTL_SECONDS]
-    for key in expired:
-        _HTML_CACHE.pop(key, None)
+class EmbedStore(Protocol):
+    """Short-lived token -> HTML storage used by `store_html` / `take_html`.
+
+    Tokens are content hashes, so `put` on an existing token adds a reference instead of a
+    copy, and `pop` drops one reference, deleting the HTML with the last one.
+    """
+
+    def put(self, token: str, html: str) -> None: ...
+
+    def get(self, token: str) -> Optional[str]: ...
+
+    def pop(self, token: str) -> Optional[str]: ...
+
+
+class InMemoryEmbedStore:
+    """Process-local store with a TTL plus entry and byte caps.
+
+    Every entry gets the same TTL, so insertion order is expiry order: expired
+    entries and cap overflow are popped from the front of an OrderedDict.
+    """
+
+    def __init__(
+        self,
+        ttl: float = _TTL_SECONDS,
+        max_entries: int | None = _MAX_ENTRIES,
+        max_bytes: int | None = _MAX_BYTES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # token -> (expires_at, html, refs)
+        self._entries: OrderedDict[str, tuple[float, str, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict_oldest(self) -> None:
+        _, (_, html, _) = self._entries.popitem(last=False)
+        self._bytes -= len(html)
+
+    def _purge(self, now: float) -> None:
+        while self._entries and next(iter(self._entries.values()))[0] <= now:
+            self._evict_oldest()
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            self._evict_oldest()
+
+    def put(self, token: str, html: str) -> None:
+        now = time.time()
+        with self._lock:
+            previous = self._entries.pop(token, None)
+            if previous is not None and previous[0] > now:
+                self._entries[token] = (now + self.ttl, previous[1], previous[2] + 1)
+            else:
+                if previous is not None:
+                    self._bytes -= len(previous[1])
+                self._entries[token] = (now + self.ttl, html, 1)
+                self._bytes += len(html)
+            self._purge(now)
+
+    def get(self, token: str) -> Optional[str]:
+        # Reads extend the TTL; moving the entry to the end keeps the dict in expiry order.
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= now:
+                return None
+            self._entries[token] = (now + self.ttl, entry[1], entry[2])
+            self._entries.move_to_end(token)
+            return entry[1]
+
+    def pop(self, token: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, html, refs = entry
+            if refs > 1 and expires_at > time.time():
+                self._entries[token] = (expires_at, html, refs - 1)
+                return html
+            del self._entries[token]
+            self._bytes -= len(html)
+        return html if expires_at > time.time() else None
+
+
+class SQLiteEmbedStore:
+    """Token -> HTML rows in a SQLite (WAL) file, shared by every worker on one host."""
+
+    def __init__(self, path: str | Path, ttl: float = _TTL_SECONDS):
+        self.path = str(path)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pylogue_embeds "
+            "(token TEXT PRIMARY KEY, html TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "refs INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pylogue_embeds)")}
+        if "refs" not in columns:
+            self._conn.execute("ALTER TABLE pylogue_embeds ADD COLUMN refs INTEGER NOT NULL DEFAULT 1")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pylogue_embeds_expires_at ON pylogue_embeds (expires_at)"
+        )
+
+    def put(self, token: str, html: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM pylogue_embeds WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "INSERT INTO pylogue_embeds (token, html, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(token) DO UPDATE SET refs = refs + 1, expires_at = excluded.expires_at",
+                (token, html, now + self.ttl),
+            )
+
+    def get(self, token: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT html FROM pylogue_embeds WHERE token = ? AND expires_at > ?", (token, now)
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE pylogue_embeds SET expires_at = ? WHERE token = ?", (now + self.ttl, token)
+                )
+        return row[0] if row else None
+
+    def pop(self, token: str) -> Optional[str]:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so only one worker can take a token.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT html, refs FROM pylogue_embeds WHERE token = ? AND expires_at > ?",
+                    (token, time.time()),
+                ).fetchone()
+                if row and row[1] > 1:
+                    self._conn.execute(
+                        "UPDATE pylogue_embeds SET refs = refs - 1 WHERE token = ?", (token,)
+                    )
+                else:
+                    self._conn.execute("DELETE FROM pylogue_embeds WHERE token = ?", (token,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+
+class RedisEmbedStore:
+    """Redis-protocol store for multi-host deployments; Redis expires the keys itself.
+
+    `client` is any redis-py compatible client (`redis.Redis`, `fakeredis.FakeRedis`).
+    """
+
+    def __init__(self, client, ttl: float = _TTL_SECONDS, prefix: str = "pylogue:embed:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        try:
+            import redis
+        except Exception as exc:
+            raise RuntimeError("RedisEmbedStore requires redis. Install with `pip install redis`.") from exc
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _keys(self, token: str) -> tuple[str, str]:
+        return f"{self.prefix}{token}", f"{self.prefix}{token}:refs"
+
+    @staticmethod
+    def _decode(raw) -> Optional[str]:
+        if raw is None:
+            return None
+        return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+    def put(self, token: str, html: str) -> None:
+        key, refs = self._keys(token)
+        ttl_ms = int(self.ttl * 1000)
+
+        def _put(pipe):
+            # Only the first reference ships the HTML; later ones bump the count.
+            exists = pipe.exists(key)
+            pipe.multi()
+            if exists:
+                pipe.pexpire(key, ttl_ms)
+            else:
+                pipe.set(key, html, px=ttl_ms)
+                pipe.delete(refs)
+            pipe.incr(refs)
+            pipe.pexpire(refs, ttl_ms)
+
+        self.client.transaction(_put, key, refs)
+
+    def get(self, token: str) -> Optional[str]:
+        key, refs = self._keys(token)
+        ttl_ms = int(self.ttl * 1000)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(key)
+        pipe.pexpire(key, ttl_ms)
+        pipe.pexpire(refs, ttl_ms)
+        return self._decode(pipe.execute()[0])
+
+    def pop(self, token: str) -> Optional[str]:
+        key, refs = self._keys(token)
+
+        def _take(pipe):
+            raw = pipe.get(key)
+            count = int(pipe.get(refs) or 0)
+            pipe.multi()
+            if count > 1:
+                pipe.decr(refs)
+            else:
+                pipe.delete(key, refs)
+            return raw
+
+        return self._decode(self.client.transaction(_take, key, refs, value_from_callable=True))
+
+
+_STORE: EmbedStore | None = None
+
+
+def embed_store_from_url(url: str | None, **kwargs) -> EmbedStore:
+    """Build a store from `memory://`, `sqlite:///path/to.db` or `redis://host:port/db`."""
+    if not url or url.startswith("memory:"):
+        return InMemoryEmbedStore(**kwargs)
+    if url.startswith("sqlite:///"):
+        return SQLiteEmbedStore(url[len("sqlite:///") :], **kwargs)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisEmbedStore.from_url(url, **kwargs)
+    raise ValueError(f"Unsupported embed store URL: {url}")
+
+
+def configure_embed_store(store: EmbedStore | str | None) -> EmbedStore:
+    """Select where embeds live: a store instance or a URL (see `embed_store_from_url`)."""
+    global _STORE
+    _STORE = embed_store_from_url(store) if store is None or isinstance(store, str) else store
+    return _STORE
+
+
+def get_embed_store() -> EmbedStore:
+    # Defaults to PYLOGUE_EMBED_STORE, which `pylogue serve` sets for its workers.
+    if _STORE is None:
+        return configure_embed_store(os.getenv("PYLOGUE_EMBED_STORE"))
+    return _STORE
+
+
+def content_token(html: str) -> str:
+    """Token for `html`: a truncated SHA-256, so identical HTML shares one blob and one cached URL."""
+    digest = hashlib.sha256(html.encode("utf-8")).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
 
 
 def store_html(html: str) -> str:
-    """Store HTML and return a short-lived token."""
-    now = time.time()
-    _purge_expired(now)
-    token = secrets.token_urlsafe(16)
-    _HTML_CACHE[token] = (now, html)
+    """Store HTML (or add a reference to identical stored HTML) and return a short-lived token."""
+    token = content_token(html)
+    get_embed_store().put(token, html)
     return token
 
 
 def take_html(token: str) -> Optional[str]:
-    """Retrieve and remove HTML by token."""
+    """Retrieve HTML by token and drop one reference; the last one removes it."""
     if not token:
         return None
-    entry = _HTML_CACHE.pop(token, None)
-    if not entry:
+    return get_embed_store().pop(token)
+
+
+def get_html(token: str) -> Optional[str]:
+    """Retrieve HTML by token without removing it (served by the `/embeds/{token}` route)."""
+    if not token:
         return None
-    _, html = entry
-    return html
+    return get_embed_store().get(token)
+
+
+def embed_placeholder(token: str) -> str:
+    """Lightweight stand-in streamed instead of the HTML; the browser fetches `/embeds/{token}`."""
+    return f'<div class="tool-html" data-embed="{html_lib.escape(token, quote=True)}"></div>'
+
+
+def embed_tokens(text: str) -> list[str]:
+    """Token of every `embed_placeholder` in `text`, once per occurrence (one reference each)."""
+    if not isinstance(text, str) or 'data-embed="' not in text:
+        return []
+    return [html_lib.unescape(token) for token in _PLACEHOLDER_RE.findall(text)]
+
+
+def resolve_embeds(text: str) -> str:
+    """`text` with each `embed_placeholder` replaced by its stored HTML again.
+
+    Used for exports and saved history, which must outlive the embed TTL. A placeholder
+    whose HTML has already expired is left as it is.
+    """
+    if not isinstance(text, str) or 'data-embed="' not in text:
+        return text
+
+    def _inline(match):
+        html = get_html(html_lib.unescape(match.group(1)))
+        if html is None:
+            return match.group(0)
+        stripped = html.strip()
+        if stripped.startswith("<div") and stripped.endswith("</div>"):
+            return html
+        return f'<div class="tool-html">{html}</div>'
+
+    return _PLACEHOLDER_RE.sub(_inline, text)
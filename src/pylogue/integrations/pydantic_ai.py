@@ -6,7 +6,7 @@ import json
 import re
 from typing import Any, Optional
 
-_TOOL_HTML_RE = re.compile(r'<div class="tool-html">.*?</div>', re.DOTALL)
+_TOOL_HTML_RE = re.compile(r'<div class="tool-html"[^>]*>.*?</div>', re.DOTALL)
 _TAG_RE = re.compile(r"<[^>]+>")
 
 
@@ -128,14 +128,30 @@ def _format_tool_status_done(args, call_id: str | None):
     )
 
 
-def _resolve_tool_html(result):
+def _resolve_tool_html(result, inline_max_bytes: int | None = None):
+    """HTML to stream for a tool result. Large HTML goes out as a `data-embed` placeholder
+    the browser fetches from `/embeds/{token}`, so it is not resent with every delta. The finished card inlines it again."""
+    try:
+        from pylogue.embeds import embed_placeholder, get_html, store_html, take_html
+    except Exception:
+        return None
     if isinstance(result, dict) and "_pylogue_html_id" in result:
         token = result.get("_pylogue_html_id")
-        try:
-            from pylogue.embeds import take_html
-        except Exception:
+        if inline_max_bytes is None:
+            return take_html(token)
+        stored = get_html(token)
+        if stored is None:
             return None
-        return take_html(token)
+        if len(stored.encode("utf-8")) <= inline_max_bytes:
+            take_html(token)
+            return stored
+        return embed_placeholder(token)
+    if (
+        inline_max_bytes is not None
+        and _should_render_tool_result_raw(None, result)
+        and len(result.encode("utf-8")) > inline_max_bytes
+    ):
+        return embed_placeholder(store_html(result))
     return None
 
 
@@ -217,6 +233,7 @@ class PydanticAIResponder:
         agent: Any,
         agent_deps: Optional[Any] = None,
         show_tool_details: bool = True,
+        inline_html_max_bytes: int | None = 16 * 1024,
     ):
         self.agent = agent
         # Preserve any existing system prompt from the agent
@@ -235,6 +252,8 @@ class PydanticAIResponder:
         self.agent_deps = agent_deps
         self.message_history = None
         self.show_tool_details = show_tool_details
+        # Tool HTML above this size is served from /embeds/{token}; None always inlines it.
+        self.inline_html_max_bytes = inline_html_max_bytes
         self._active_user = None
         
         # Register dynamic system prompt function once per agent
@@ -321,9 +340,9 @@ class PydanticAIResponder:
                     )
                 )
             answer_text = card.get("answer_text") if isinstance(card, dict) else None
-            if answer_text is None:
-                answer_text = answer
-            answer_text = _sanitize_history_answer(answer_text)
+            if not isinstance(answer_text, str):
+                # Pylogue stores answer_text already sanitized; only raw answers need the regex pass.
+                answer_text = _sanitize_history_answer(answer)
             if answer_text:
                 history.append(
                     pai_messages.ModelResponse(
@@ -398,7 +417,7 @@ class PydanticAIResponder:
                 else:
                     args = None
                 if tool_name or args or result:
-                    resolved_html = _resolve_tool_html(result)
+                    resolved_html = _resolve_tool_html(result, self.inline_html_max_bytes)
                     if not self.show_tool_details:
                         yield _format_tool_status_done(args, call_id)
                     if resolved_html:
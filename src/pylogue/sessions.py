@@ -0,0 +1,403 @@
+# Session stores for register_ws_routes
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Protocol
+
+_DEFAULT_TTL_SECONDS = 60 * 60 * 24
+
+
+class SessionStore(Protocol):
+    """Durable conversation state shared by every worker serving `/ws`.
+
+    `data` is an export payload (`{"cards": [...], "meta": {...}}`). Chunks
+    appended after the last `put` are folded into the matching card's answer
+    by `get`, so a partially streamed answer survives a reconnect. `put_card`
+    writes one finished turn without rewriting the rest of the conversation.
+    """
+
+    def get(self, session_id: str) -> dict | None: ...
+
+    def put(self, session_id: str, data: dict) -> None: ...
+
+    def put_card(self, session_id: str, card: dict, fields: dict | None = None) -> bool:
+        """Replace (or append) the card with `card["id"]`, drop its chunks and set the top-level
+        `fields` (`None` removes a key). Returns False when the session is not stored; the
+        caller then writes it with `put`."""
+        ...
+
+    def append_chunk(self, session_id: str, card_id: str, chunk: str) -> None: ...
+
+    def expire(self, session_id: str, ttl: float) -> None: ...
+
+
+def _merge_chunks(data: dict, chunks) -> dict:
+    cards = [dict(card) for card in data.get("cards", []) if isinstance(card, dict)]
+    by_id = {str(card.get("id")): card for card in cards}
+    for card_id, chunk in chunks:
+        card = by_id.get(str(card_id))
+        if card is not None:
+            card["answer"] = (card.get("answer") or "") + chunk
+            card.pop("answer_text", None)
+    merged = dict(data)
+    merged["cards"] = cards
+    return merged
+
+
+def _apply_fields(data: dict, fields: dict | None) -> None:
+    for key, value in (fields or {}).items():
+        if value is None:
+            data.pop(key, None)
+        else:
+            data[key] = value
+
+
+class InMemorySessionStore:
+    """Process-local store; the default when no shared backend is configured.
+
+    `max_entries` caps the number of sessions kept (`None` for no cap); the least
+    recently written go first.
+    """
+
+    def __init__(self, ttl: float = _DEFAULT_TTL_SECONDS, max_entries: int | None = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def _purge_expired(self, now: float) -> None:
+        if now < self._next_purge:
+            return
+        self._next_purge = now + 60
+        expired = [key for key, entry in self._entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            self._entries.pop(key, None)
+
+    def get(self, session_id: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                self._entries.pop(session_id, None)
+                return None
+            return _merge_chunks({**entry["data"], "cards": entry["cards"]}, entry["chunks"])
+
+    def _evict(self) -> None:
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+
+    def put(self, session_id: str, data: dict) -> None:
+        now = time.time()
+        fields = {key: value for key, value in data.items() if key != "cards"}
+        cards = [dict(card) for card in data.get("cards", []) if isinstance(card, dict)]
+        with self._lock:
+            self._purge_expired(now)
+            self._entries.pop(session_id, None)
+            self._entries[session_id] = {
+                "data": fields,
+                "cards": cards,
+                "index": {str(card.get("id")): pos for pos, card in enumerate(cards)},
+                "chunks": [],
+                "expires_at": now + self.ttl,
+            }
+            self._evict()
+
+    def put_card(self, session_id: str, card: dict, fields: dict | None = None) -> bool:
+        now = time.time()
+        card = dict(card)
+        card_id = str(card.get("id"))
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None or entry["expires_at"] <= now:
+                return False
+            # Re-inserted, so the session counts as the most recently written one.
+            self._entries[session_id] = entry
+            pos = entry["index"].get(card_id)
+            if pos is None:
+                entry["index"][card_id] = len(entry["cards"])
+                entry["cards"].append(card)
+            else:
+                entry["cards"][pos] = card
+            if entry["chunks"]:
+                entry["chunks"] = [item for item in entry["chunks"] if str(item[0]) != card_id]
+            _apply_fields(entry["data"], fields)
+            entry["expires_at"] = now + self.ttl
+        return True
+
+    def append_chunk(self, session_id: str, card_id: str, chunk: str) -> None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry["chunks"].append((card_id, chunk))
+
+    def expire(self, session_id: str, ttl: float) -> None:
+        with self._lock:
+            if ttl <= 0:
+                self._entries.pop(session_id, None)
+                return
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry["expires_at"] = time.time() + ttl
+
+
+class SQLiteSessionStore:
+    """SQLite (WAL) store; lets workers on one host share sessions."""
+
+    def __init__(self, path: str | Path, ttl: float = _DEFAULT_TTL_SECONDS):
+        self.path = str(path)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pylogue_sessions "
+            "(id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pylogue_session_chunks "
+            "(session_id TEXT NOT NULL, card_id TEXT NOT NULL, chunk TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pylogue_session_chunks_session "
+            "ON pylogue_session_chunks (session_id)"
+        )
+        # One row per card, so a finished turn rewrites only its own card.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pylogue_session_cards "
+            "(session_id TEXT NOT NULL, card_id TEXT NOT NULL, pos INTEGER NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, card_id))"
+        )
+
+    def get(self, session_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, expires_at FROM pylogue_sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= time.time():
+                self._delete(session_id)
+                return None
+            cards = self._conn.execute(
+                "SELECT data FROM pylogue_session_cards WHERE session_id = ? ORDER BY pos",
+                (session_id,),
+            ).fetchall()
+            chunks = self._conn.execute(
+                "SELECT card_id, chunk FROM pylogue_session_chunks WHERE session_id = ? ORDER BY rowid",
+                (session_id,),
+            ).fetchall()
+        data = json.loads(row[0])
+        data["cards"] = [json.loads(card[0]) for card in cards]
+        return _merge_chunks(data, chunks)
+
+    def put(self, session_id: str, data: dict) -> None:
+        payload = json.dumps({key: value for key, value in data.items() if key != "cards"})
+        cards = [
+            (session_id, str(card.get("id")), pos, json.dumps(card))
+            for pos, card in enumerate(card for card in data.get("cards", []) if isinstance(card, dict))
+        ]
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO pylogue_sessions (id, data, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                    (session_id, payload, now + self.ttl),
+                )
+                self._conn.execute("DELETE FROM pylogue_session_cards WHERE session_id = ?", (session_id,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO pylogue_session_cards (session_id, card_id, pos, data) "
+                    "VALUES (?, ?, ?, ?)",
+                    cards,
+                )
+                self._conn.execute("DELETE FROM pylogue_session_chunks WHERE session_id = ?", (session_id,))
+                self._purge_expired(now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def put_card(self, session_id: str, card: dict, fields: dict | None = None) -> bool:
+        card_id = str(card.get("id"))
+        payload = json.dumps(card)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM pylogue_sessions WHERE id = ? AND expires_at > ?", (session_id, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                data = json.loads(row[0])
+                _apply_fields(data, fields)
+                self._conn.execute(
+                    "UPDATE pylogue_sessions SET data = ?, expires_at = ? WHERE id = ?",
+                    (json.dumps(data), now + self.ttl, session_id),
+                )
+                self._conn.execute(
+                    "INSERT INTO pylogue_session_cards (session_id, card_id, pos, data) "
+                    "VALUES (?, ?, (SELECT COALESCE(MAX(pos) + 1, 0) FROM pylogue_session_cards WHERE session_id = ?), ?) "
+                    "ON CONFLICT(session_id, card_id) DO UPDATE SET data = excluded.data",
+                    (session_id, card_id, session_id, payload),
+                )
+                self._conn.execute(
+                    "DELETE FROM pylogue_session_chunks WHERE session_id = ? AND card_id = ?",
+                    (session_id, card_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def _purge_expired(self, now: float) -> None:
+        expired = "SELECT id FROM pylogue_sessions WHERE expires_at <= ?"
+        self._conn.execute(f"DELETE FROM pylogue_session_cards WHERE session_id IN ({expired})", (now,))
+        self._conn.execute(f"DELETE FROM pylogue_session_chunks WHERE session_id IN ({expired})", (now,))
+        self._conn.execute("DELETE FROM pylogue_sessions WHERE expires_at <= ?", (now,))
+
+    def append_chunk(self, session_id: str, card_id: str, chunk: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pylogue_session_chunks (session_id, card_id, chunk) VALUES (?, ?, ?)",
+                (session_id, str(card_id), chunk),
+            )
+
+    def _delete(self, session_id: str) -> None:
+        self._conn.execute("DELETE FROM pylogue_sessions WHERE id = ?", (session_id,))
+        self._conn.execute("DELETE FROM pylogue_session_cards WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM pylogue_session_chunks WHERE session_id = ?", (session_id,))
+
+    def expire(self, session_id: str, ttl: float) -> None:
+        with self._lock:
+            if ttl <= 0:
+                self._delete(session_id)
+                return
+            self._conn.execute(
+                "UPDATE pylogue_sessions SET expires_at = ? WHERE id = ?",
+                (time.time() + ttl, session_id),
+            )
+
+
+class RedisSessionStore:
+    """Redis-protocol store for multi-host deployments.
+
+    `client` is any redis-py compatible client (`redis.Redis`, `fakeredis.FakeRedis`).
+    A session is four keys: the top-level fields, a hash of cards by id, the card order and the chunks.
+    """
+
+    def __init__(self, client, ttl: float = _DEFAULT_TTL_SECONDS, prefix: str = "pylogue:session:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        try:
+            import redis
+        except Exception as exc:
+            raise RuntimeError("RedisSessionStore requires redis. Install with `pip install redis`.") from exc
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _keys(self, session_id: str) -> tuple[str, str, str, str]:
+        key = f"{self.prefix}{session_id}"
+        return key, f"{key}:cards", f"{key}:order", f"{key}:chunks"
+
+    def get(self, session_id: str) -> dict | None:
+        key, cards_key, order_key, chunks_key = self._keys(session_id)
+        pipe = self.client.pipeline()
+        pipe.get(key)
+        pipe.hgetall(cards_key)
+        pipe.lrange(order_key, 0, -1)
+        pipe.lrange(chunks_key, 0, -1)
+        raw, raw_cards, order, raw_chunks = pipe.execute()
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        raw_cards = raw_cards or {}
+        data["cards"] = [json.loads(raw_cards[card_id]) for card_id in order or [] if card_id in raw_cards]
+        chunks = [json.loads(item) for item in raw_chunks or []]
+        return _merge_chunks(data, chunks)
+
+    def put(self, session_id: str, data: dict) -> None:
+        key, cards_key, order_key, chunks_key = self._keys(session_id)
+        ttl_ms = int(self.ttl * 1000)
+        cards = {
+            str(card.get("id")): json.dumps(card) for card in data.get("cards", []) if isinstance(card, dict)
+        }
+        pipe = self.client.pipeline()
+        pipe.set(key, json.dumps({k: v for k, v in data.items() if k != "cards"}), px=ttl_ms)
+        pipe.delete(cards_key, order_key, chunks_key)
+        if cards:
+            pipe.hset(cards_key, mapping=cards)
+            pipe.rpush(order_key, *cards)
+            pipe.pexpire(cards_key, ttl_ms)
+            pipe.pexpire(order_key, ttl_ms)
+        pipe.execute()
+
+    def put_card(self, session_id: str, card: dict, fields: dict | None = None) -> bool:
+        key, cards_key, order_key, chunks_key = self._keys(session_id)
+        ttl_ms = int(self.ttl * 1000)
+        card_id = str(card.get("id"))
+        payload = json.dumps(card)
+
+        def _write(pipe):
+            # WATCHed: a chunk appended or a put landing meanwhile makes redis-py retry.
+            raw = pipe.get(key)
+            if raw is None:
+                return False
+            known = pipe.hexists(cards_key, card_id)
+            kept = [item for item in pipe.lrange(chunks_key, 0, -1) if json.loads(item)[0] != card_id]
+            data = json.loads(raw)
+            _apply_fields(data, fields)
+            pipe.multi()
+            pipe.set(key, json.dumps(data), px=ttl_ms)
+            pipe.hset(cards_key, card_id, payload)
+            if not known:
+                pipe.rpush(order_key, card_id)
+            pipe.delete(chunks_key)
+            if kept:
+                pipe.rpush(chunks_key, *kept)
+                pipe.pexpire(chunks_key, ttl_ms)
+            pipe.pexpire(cards_key, ttl_ms)
+            pipe.pexpire(order_key, ttl_ms)
+            return True
+
+        return self.client.transaction(_write, key, chunks_key, value_from_callable=True)
+
+    def append_chunk(self, session_id: str, card_id: str, chunk: str) -> None:
+        chunks_key = self._keys(session_id)[3]
+        pipe = self.client.pipeline()
+        pipe.rpush(chunks_key, json.dumps([str(card_id), chunk]))
+        pipe.pexpire(chunks_key, int(self.ttl * 1000))
+        pipe.execute()
+
+    def expire(self, session_id: str, ttl: float) -> None:
+        keys = self._keys(session_id)
+        if ttl <= 0:
+            self.client.delete(*keys)
+            return
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.pexpire(key, int(ttl * 1000))
+        pipe.execute()
+
+
+def session_store_from_url(url: str | None, **kwargs) -> SessionStore:
+    """Build a store from `memory://`, `sqlite:///path/to.db` or `redis://host:port/db`."""
+    if not url or url.startswith("memory:"):
+        return InMemorySessionStore(**kwargs)
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///") :], **kwargs)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionStore.from_url(url, **kwargs)
+    raise ValueError(f"Unsupported session store URL: {url}")
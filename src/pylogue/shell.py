@@ -5,13 +5,18 @@ Run: python -m scripts.examples.chat_app_with_histories.main
 
 from dataclasses import dataclass
 from datetime import datetime, timezone
+import hashlib
+import hmac
 import json
 import os
+import secrets
 from pathlib import Path
 from uuid import uuid4
 
 from fasthtml.common import *
 from fastsql import Database
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from monsterui.all import (
     Button,
     ButtonT,
@@ -26,6 +31,7 @@ from monsterui.all import (
 from pylogue.core import (
     EchoResponder,
     IMPORT_PREFIX,
+    _normalize_imported_cards,
     _register_google_auth_routes,
     _session_cookie_name,
     google_oauth_config_from_env,
@@ -44,7 +50,6 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 CHAT_APP_DIR = PROJECT_ROOT / "scripts" / "examples" / "chat_app_with_histories"
 STATIC_DIR = CHAT_APP_DIR / "static"
 DB_PATH = CHAT_APP_DIR / "chat_app.db"
-db = Database(f"sqlite:///{DB_PATH}")
 
 
 @dataclass
@@ -53,16 +58,248 @@ class Chat:
     title: str
     created_at: str
     updated_at: str
-    payload: str = ""
+    meta: str = ""
+    card_count: int = 0
 
 
-chats = db.create(Chat, pk="id")
+@dataclass
+class Card:
+    chat_id: str
+    seq: int
+    question: str = ""
+    answer: str = ""
+    answer_text: str = ""
+    # Any other card keys, as JSON.
+    extra: str = ""
+
+
+CARDS_PAGE_SIZE = 50
+MAX_CARDS_PAGE_SIZE = 500
+_CARD_COLUMNS = ("question", "answer", "answer_text", "extra")
 
 
 def _utc_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
+def _chat_json(chat: Chat) -> dict:
+    return {
+        "id": chat.id,
+        "title": chat.title,
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+    }
+
+
+def _payload_dict(text: str) -> dict:
+    """A stored JSON payload as `{"cards": [...], "meta": ...}`."""
+    try:
+        data = json.loads(text) if text else {}
+    except json.JSONDecodeError:
+        return {"cards": []}
+    if isinstance(data, list):
+        # Legacy role/content lists.
+        cards, _ = _normalize_imported_cards(data)
+        return {"cards": cards}
+    return data if isinstance(data, dict) else {"cards": []}
+
+
+def _card_row(chat_id: str, seq: int, card: dict) -> dict:
+    card = card if isinstance(card, dict) else {}
+    extra = {k: v for k, v in card.items() if k not in ("id", "question", "answer", "answer_text")}
+    return {
+        "chat_id": chat_id,
+        "seq": seq,
+        "question": str(card.get("question") or ""),
+        "answer": str(card.get("answer") or ""),
+        "answer_text": str(card.get("answer_text") or ""),
+        "extra": json.dumps(extra) if extra else "",
+    }
+
+
+def _row_card(row: dict) -> dict:
+    card = json.loads(row["extra"]) if row.get("extra") else {}
+    # Card ids are positions in the chat, so `seq` is the id.
+    card.update(
+        id=str(row["seq"]), question=row["question"], answer=row["answer"], answer_text=row["answer_text"]
+    )
+    return card
+
+
+def _history_signature(secret: bytes, chat_id: str, email: str | None) -> str:
+    """HMAC binding a paged chat's `history` reference to the user it was served to."""
+    message = f"{chat_id}\n{email or ''}".encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()
+
+
+def _get_chat(database: Database, chat_id: str) -> Chat | None:
+    try:
+        return database.table("chats")[chat_id]
+    except Exception:
+        return None
+
+
+def _chat_cards(database: Database, chat_id: str, start: int = 0, end: int | None = None) -> list[dict]:
+    """Cards `start..end` of a chat, read by primary key range."""
+    sql = "SELECT * FROM cards WHERE chat_id = :chat_id AND seq >= :start"
+    params = {"chat_id": chat_id, "start": max(0, start)}
+    if end is not None:
+        sql += " AND seq < :end"
+        params["end"] = end
+    return [_row_card(row) for row in database.q(sql + " ORDER BY seq", **params)]
+
+
+def _store_chat(database: Database, chat: Chat, cards: list | None = None, start: int = 0) -> Chat:
+    """Upsert `chat`; with `cards`, they become the chat's cards from index `start` on.
+
+    Only new cards are inserted and only changed ones rewritten, so saving after a turn
+    appends one row instead of rewriting the conversation. Stored cards past the end are dropped.
+    """
+    chats_table = database.table("chats").table
+    cards_table = database.table("cards").table
+    stored = _get_chat(database, chat.id)
+    stored_count = stored.card_count if stored else 0
+    conn = database.conn
+    try:
+        if cards is not None:
+            end = start + len(cards)
+            existing = {
+                row["seq"]: row
+                for row in database.q(
+                    "SELECT * FROM cards WHERE chat_id = :chat_id AND seq >= :start AND seq < :end",
+                    chat_id=chat.id,
+                    start=start,
+                    end=end,
+                )
+            }
+            inserts = []
+            for offset, card in enumerate(cards):
+                row = _card_row(chat.id, start + offset, card)
+                old = existing.get(row["seq"])
+                if old is None:
+                    inserts.append(row)
+                elif any(old[key] != row[key] for key in _CARD_COLUMNS):
+                    conn.execute(
+                        sa.update(cards_table)
+                        .where(cards_table.c.chat_id == chat.id, cards_table.c.seq == row["seq"])
+                        .values({key: row[key] for key in _CARD_COLUMNS})
+                    )
+            if inserts:
+                conn.execute(sa.insert(cards_table), inserts)
+            if stored_count > end:
+                conn.execute(sa.delete(cards_table).where(cards_table.c.chat_id == chat.id, cards_table.c.seq >= end))
+            chat.card_count = end
+        else:
+            chat.card_count = stored_count
+        _upsert_chat_row(conn, chats_table, chat)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return chat
+
+
+def _store_card(database: Database, chat: Chat, seq: int, card: dict) -> Chat:
+    """Insert or rewrite card `seq` of `chat` (at most one past its last card) and upsert the chat row."""
+    cards_table = database.table("cards").table
+    row = _card_row(chat.id, seq, card)
+    conn = database.conn
+    try:
+        conn.execute(
+            sqlite_insert(cards_table)
+            .values(row)
+            .on_conflict_do_update(
+                index_elements=["chat_id", "seq"], set_={key: row[key] for key in _CARD_COLUMNS}
+            )
+        )
+        chat.card_count = max(chat.card_count, seq + 1)
+        _upsert_chat_row(conn, database.table("chats").table, chat)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return chat
+
+
+def _upsert_chat_row(conn, chats_table, chat: Chat) -> None:
+    values = {
+        "id": chat.id,
+        "title": chat.title,
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+        "meta": chat.meta,
+        "card_count": chat.card_count,
+    }
+    conn.execute(
+        sqlite_insert(chats_table)
+        .values(values)
+        .on_conflict_do_update(index_elements=["id"], set_={k: v for k, v in values.items() if k != "id"})
+    )
+
+
+def _delete_chat(database: Database, chat_id: str) -> None:
+    chats_table = database.table("chats").table
+    cards_table = database.table("cards").table
+    conn = database.conn
+    try:
+        conn.execute(sa.delete(cards_table).where(cards_table.c.chat_id == chat_id))
+        conn.execute(sa.delete(chats_table).where(chats_table.c.id == chat_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migrate_chat_db(database: Database) -> int:
+    """Move chats from the old one-row-per-chat `chat` table (a JSON `payload` column) into
+    `chats`/`cards`, then drop it. Runs in one transaction; returns the number of chats moved."""
+    inspector = sa.inspect(database.conn)
+    if "chat" not in inspector.get_table_names():
+        return 0
+    if "payload" not in {column["name"] for column in inspector.get_columns("chat")}:
+        return 0
+    chats_table = database.table("chats").table
+    cards_table = database.table("cards").table
+    rows = database.q("SELECT * FROM chat")
+    conn = database.conn
+    try:
+        for row in rows:
+            data = _payload_dict(row.get("payload") or "")
+            cards = [_card_row(row["id"], seq, card) for seq, card in enumerate(data.get("cards") or [])]
+            meta = data.get("meta")
+            conn.execute(
+                sa.insert(chats_table).prefix_with("OR REPLACE"),
+                {
+                    "id": row["id"],
+                    "title": row.get("title") or "New chat",
+                    "created_at": row.get("created_at") or "",
+                    "updated_at": row.get("updated_at") or row.get("created_at") or "",
+                    "meta": json.dumps(meta) if meta is not None else "",
+                    "card_count": len(cards),
+                },
+            )
+            conn.execute(sa.delete(cards_table).where(cards_table.c.chat_id == row["id"]))
+            if cards:
+                conn.execute(sa.insert(cards_table), cards)
+        conn.execute(sa.text("DROP TABLE chat"))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def open_chat_db(path: Path | str = DB_PATH) -> Database:
+    """The chat history database at `path`, with its tables created and old files migrated."""
+    database = Database(f"sqlite:///{path}")
+    database.create(Chat, pk="id", name="chats")
+    database.create(Card, pk=["chat_id", "seq"], name="cards")
+    database.execute(sa.text("CREATE INDEX IF NOT EXISTS chats_updated_at ON chats (updated_at)"))
+    database.conn.commit()
+    migrate_chat_db(database)
+    return database
+
+
 def app_factory(
     responder=None,
     responder_factory=None,
@@ -73,9 +310,10 @@ def app_factory(
         "One UI wraps multiple Pylogue chat sessions. Pick a chat on the left, "
         "start a new one, or return to previous conversations instantly."
     ),
+    session_store=None,
 ) -> MUFastHTML:
     resolved_db_path = Path(db_path) if db_path is not None else DB_PATH
-    local_db = Database(f"sqlite:///{resolved_db_path}")
+    local_db = open_chat_db(resolved_db_path)
     if responder_factory is None:
         responder = responder or EchoResponder()
     headers = list(get_core_headers(include_markdown=True))
@@ -111,6 +349,19 @@ def app_factory(
         auth = request.session.get("auth")
         return isinstance(auth, dict)
 
+    # Signs the history references handed to the browser; workers share it through the session secret.
+    history_secret = session_secret.encode("utf-8") if session_secret else secrets.token_bytes(32)
+
+    def _request_email(request: Request) -> str | None:
+        auth = request.session.get("auth") if auth_required else None
+        return auth.get("email") if isinstance(auth, dict) else None
+
+    def _history_access(history: dict, context) -> bool:
+        # The socket only reads chats whose reference this app signed for the same user.
+        email = ((context or {}).get("user") or {}).get("email") if auth_required else None
+        expected = _history_signature(history_secret, history["source"], email)
+        return hmac.compare_digest(str(history.get("signature") or ""), expected)
+
     @app.route("/static/chat_app.css")
     def _chat_app_css():
         return FileResponse(STATIC_DIR / "chat_app.css")
@@ -123,104 +374,131 @@ def app_factory(
     def list_chats(request: Request):
         if not _is_authorized(request):
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        items = list(local_db.create(Chat, pk="id")())
-        items.sort(key=lambda c: c.updated_at or c.created_at, reverse=True)
-        return JSONResponse(
-            [
-                {
-                    "id": c.id,
-                    "title": c.title,
-                    "created_at": c.created_at,
-                    "updated_at": c.updated_at,
-                }
-                for c in items
-            ]
-        )
+        items = local_db.table("chats")(order_by="updated_at DESC")
+        return JSONResponse([_chat_json(c) for c in items])
 
     @app.route("/api/chats", methods=["POST"])
     async def create_chat(request: Request):
         if not _is_authorized(request):
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        chats = local_db.create(Chat, pk="id")
         data = await request.json()
         chat_id = data.get("id") or str(uuid4())
         title = data.get("title") or "New chat"
         now = _utc_iso()
         payload = data.get("payload")
-        payload_str = json.dumps(payload) if payload is not None else ""
-        chat = Chat(chat_id, title, now, now, payload_str)
-        try:
-            _ = chats[chat_id]
-            chats.update(chat)
-        except Exception:
-            chats.insert(chat)
-        return JSONResponse(
-            {
-                "id": chat.id,
-                "title": chat.title,
-                "created_at": chat.created_at,
-                "updated_at": chat.updated_at,
-            }
-        )
+        payload = payload if isinstance(payload, dict) else {"cards": []}
+        meta = payload.get("meta")
+        chat = Chat(chat_id, title, now, now, json.dumps(meta) if meta is not None else "")
+        _store_chat(local_db, chat, list(payload.get("cards") or []))
+        return JSONResponse(_chat_json(chat))
 
     @app.route("/api/chats/{chat_id}", methods=["GET"])
     def get_chat(request: Request, chat_id: str):
         if not _is_authorized(request):
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        chats = local_db.create(Chat, pk="id")
-        try:
-            chat = chats[chat_id]
-        except Exception:
-            return JSONResponse({"cards": []})
-        payload = chat.payload or ""
-        if not payload:
+        chat = _get_chat(local_db, chat_id)
+        if chat is None:
             return JSONResponse({"cards": []})
-        try:
-            data = json.loads(payload)
-        except json.JSONDecodeError:
-            data = {"cards": []}
+        data = {"cards": _chat_cards(local_db, chat_id)}
+        if chat.meta:
+            data["meta"] = json.loads(chat.meta)
         return JSONResponse(data)
 
+    @app.route("/api/chats/{chat_id}/cards", methods=["GET"])
+    def get_chat_cards(request: Request, chat_id: str):
+        """The `limit` newest cards before `cursor` (a card index; default: the end of the chat).
+
+        Pass `next_cursor` back for the page before this one; it is null on the oldest page.
+        The first page also carries `meta` and a `history` reference, so it can be sent to the
+        chat socket as an import, which then loads older turns through `history_loader`.
+        """
+        if not _is_authorized(request):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        chat = _get_chat(local_db, chat_id)
+        total = chat.card_count if chat else 0
+        cursor = request.query_params.get("cursor") or None
+        try:
+            limit = min(max(1, int(request.query_params.get("limit") or CARDS_PAGE_SIZE)), MAX_CARDS_PAGE_SIZE)
+            end = total if cursor is None else min(max(0, int(cursor)), total)
+        except ValueError:
+            return JSONResponse({"error": "Invalid cursor or limit"}, status_code=400)
+        start = max(0, end - limit)
+        cards = _chat_cards(local_db, chat_id, start, end) if end > start else []
+        page = {"cards": cards, "start": start, "total": total, "next_cursor": start or None}
+        if cursor is None:
+            if chat is not None and chat.meta:
+                page["meta"] = json.loads(chat.meta)
+            page["history"] = {
+                "source": chat_id,
+                "start": start,
+                "signature": _history_signature(history_secret, chat_id, _request_email(request)),
+            }
+        return JSONResponse(page)
+
     @app.route("/api/chats/{chat_id}", methods=["POST"])
     async def save_chat(chat_id: str, request: Request):
+        """Save a chat. Without `payload` only the title changes; with one, new cards are
+        appended and changed ones rewritten (see `_store_chat`)."""
         if not _is_authorized(request):
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        chats = local_db.create(Chat, pk="id")
         data = await request.json()
-        payload = data.get("payload") or {"cards": []}
         title = data.get("title") or "New chat"
         now = _utc_iso()
-        try:
-            existing = chats[chat_id]
-            created_at = existing.created_at
-        except Exception:
-            created_at = data.get("created_at") or now
-        chat = Chat(chat_id, title, created_at, now, json.dumps(payload))
-        try:
-            _ = chats[chat_id]
-            chats.update(chat)
-        except Exception:
-            chats.insert(chat)
-        return JSONResponse(
-            {
-                "id": chat.id,
-                "title": chat.title,
-                "created_at": chat.created_at,
-                "updated_at": chat.updated_at,
-            }
-        )
+        existing = _get_chat(local_db, chat_id)
+        created_at = existing.created_at if existing else data.get("created_at") or now
+        chat = Chat(chat_id, title, created_at, now, existing.meta if existing else "")
+        if "payload" not in data:
+            _store_chat(local_db, chat)
+            return JSONResponse(_chat_json(chat))
+        payload = data.get("payload")
+        payload = payload if isinstance(payload, dict) else {"cards": []}
+        history = payload.get("history")
+        start = 0
+        if isinstance(history, dict) and history.get("source") == chat_id and isinstance(history.get("start"), int):
+            # A paged session exports only its newest cards; the stored ones before them stay.
+            start = min(max(0, history["start"]), existing.card_count if existing else 0)
+        meta = payload.get("meta")
+        chat.meta = json.dumps(meta) if meta is not None else ""
+        _store_chat(local_db, chat, list(payload.get("cards") or []), start)
+        return JSONResponse(_chat_json(chat))
+
+    @app.route("/api/chats/{chat_id}/cards/{seq}", methods=["POST"])
+    async def save_chat_card(chat_id: str, seq: int, request: Request):
+        """Save one finished turn: card `seq` is inserted or rewritten, the other cards are not read."""
+        if not _is_authorized(request):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        data = await request.json()
+        card = data.get("card")
+        if not isinstance(card, dict):
+            return JSONResponse({"error": "Missing card"}, status_code=400)
+        existing = _get_chat(local_db, chat_id)
+        count = existing.card_count if existing else 0
+        if seq < 0 or seq > count:
+            # A gap would break the seq numbering; the client falls back to a full save.
+            return JSONResponse({"error": "Card index out of range"}, status_code=409)
+        now = _utc_iso()
+        title = data.get("title") or (existing.title if existing else "New chat")
+        created_at = existing.created_at if existing else now
+        chat = Chat(chat_id, title, created_at, now, existing.meta if existing else "", count)
+        if "meta" in data:
+            meta = data.get("meta")
+            chat.meta = json.dumps(meta) if meta is not None else ""
+        _store_card(local_db, chat, seq, card)
+        return JSONResponse(_chat_json(chat))
 
     @app.route("/api/chats/{chat_id}", methods=["DELETE"])
     def delete_chat(request: Request, chat_id: str):
         if not _is_authorized(request):
             return JSONResponse({"error": "Unauthorized"}, status_code=401)
-        chats = local_db.create(Chat, pk="id")
         try:
-            chats.delete(chat_id)
+            _delete_chat(local_db, chat_id)
         except Exception:
             pass
         return JSONResponse({"deleted": True})
 
+    def _load_chat_cards(chat_id: str, start: int, end: int):
+        return _chat_cards(local_db, chat_id, start, end)
+
     sessions: dict[int, dict] = {}
     register_ws_routes(
         app,
@@ -228,6 +506,9 @@ def app_factory(
         responder_factory=responder_factory,
         sessions=sessions,
         auth_required=auth_required,
+        session_store=session_store,
+        history_loader=_load_chat_cards,
+        history_access=_history_access,
     )
 
     def _sidebar(request: Request):
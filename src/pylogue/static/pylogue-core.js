@@ -1,16 +1,250 @@
 
             document.documentElement.classList.remove('dark');
             const STOP_PREFIX = '__PYLOGUE_STOP__:';
+            const RESYNC_PREFIX = '__PYLOGUE_RESYNC__:';
+            const RESUME_PREFIX = '__PYLOGUE_RESUME__:';
+            const IMPORT_CHUNK_PREFIX = '__PYLOGUE_IMPORT_CHUNK__:';
+            const OLDER_PREFIX = '__PYLOGUE_OLDER__:';
+            const IMPORT_CHUNK_SIZE = 256 * 1024;
+            const decodeBinary = (binary) => {
+              const bytes = Uint8Array.from(binary, (c) => c.charCodeAt(0));
+              return new TextDecoder('utf-8').decode(bytes);
+            };
             const decodeCopyB64 = (value) => {
               if (!value) return '';
               try {
-                const binary = atob(value);
-                const bytes = Uint8Array.from(binary, (c) => c.charCodeAt(0));
-                return new TextDecoder('utf-8').decode(bytes);
+                return decodeBinary(atob(value));
               } catch {
                 return '';
               }
             };
+            let pylogueSocket = null;
+            let pylogueSessionId = null;
+            let pylogueExportUrl = null;
+            let pylogueEmbedsUrl = null;
+            let pylogueStream = null;
+            let pendingPrompt = null;
+            const sendControlMessage = (message) => {
+              if (!pylogueSocket || typeof pylogueSocket.send !== 'function') return false;
+              pylogueSocket.send(JSON.stringify({ msg: message }));
+              return true;
+            };
+            window.__pylogueSendControl = sendControlMessage;
+            // Export state is built on demand by the server instead of shipped with every turn.
+            // With `cardId`, only that card is exported (a history app saving one finished turn).
+            const fetchExport = async (cardId) => {
+              if (!pylogueSessionId || !pylogueExportUrl) return null;
+              let url = `${pylogueExportUrl}?session=${encodeURIComponent(pylogueSessionId)}`;
+              if (cardId !== undefined && cardId !== null) url += `&card=${encodeURIComponent(cardId)}`;
+              try {
+                const response = await fetch(url, { credentials: 'same-origin' });
+                return response.ok ? await response.json() : null;
+              } catch {
+                return null;
+              }
+            };
+            window.__pylogueFetchExport = fetchExport;
+            // Large tool HTML streams as a `data-embed` placeholder; fetch each token once
+            // (the route is HTTP-cached) and reuse it when markdown re-renders the answer.
+            const embedCache = new Map();
+            const hydrateEmbeds = (root = document) => {
+              root.querySelectorAll('.tool-html[data-embed]').forEach((el) => {
+                if (el.dataset.embedState) return;
+                const token = el.dataset.embed;
+                let pending = embedCache.get(token);
+                if (!pending) {
+                  // Embeds are served only to the session whose answer referenced them.
+                  const url = `${pylogueEmbedsUrl || '/embeds'}/${encodeURIComponent(token)}`
+                    + `?session=${encodeURIComponent(pylogueSessionId || '')}`;
+                  pending = fetch(url, { credentials: 'same-origin' })
+                    .then((response) => (response.ok ? response.text() : null))
+                    .catch(() => null);
+                  embedCache.set(token, pending);
+                }
+                el.dataset.embedState = 'loading';
+                pending.then((html) => {
+                  if (html === null) {
+                    embedCache.delete(token);
+                    el.dataset.embedState = 'missing';
+                    el.textContent = 'Embedded output is no longer available.';
+                    return;
+                  }
+                  el.innerHTML = html;
+                  el.dataset.embedState = 'loaded';
+                });
+              });
+            };
+            window.__pylogueHydrateEmbeds = hydrateEmbeds;
+            // Large histories go out as ordered slices the server parses incrementally.
+            const importConversation = (payload) => {
+              const text = typeof payload === 'string' ? payload : JSON.stringify(payload ?? []);
+              if (!pylogueSocket) return false;
+              const id = Math.random().toString(36).slice(2);
+              let start = 0;
+              let seq = 0;
+              do {
+                let end = Math.min(text.length, start + IMPORT_CHUNK_SIZE);
+                const last = text.charCodeAt(end - 1);
+                // Never split a surrogate pair across slices.
+                if (end < text.length && last >= 0xd800 && last <= 0xdbff) end -= 1;
+                const header = JSON.stringify({ id, seq, final: end >= text.length });
+                sendControlMessage(`${IMPORT_CHUNK_PREFIX}${header}\n${text.slice(start, end)}`);
+                start = end;
+                seq += 1;
+              } while (start < text.length);
+              return true;
+            };
+            window.__pylogueImport = importConversation;
+            // Only the newest page of a long chat is sent up front. #cards-older stands in for the
+            // rest; when it nears the viewport, ask for the page before it and keep the reader's
+            // position (#cards disables scroll anchoring, so the page would otherwise jump).
+            let olderPending = null;
+            const requestOlder = (marker) => {
+              const before = Number(marker.dataset.before || 0);
+              if (!before || (olderPending && olderPending.before === before)) return;
+              if (!sendControlMessage(`${OLDER_PREFIX}${before}`)) return;
+              const scroller = document.scrollingElement || document.documentElement;
+              olderPending = { before, fromBottom: scroller.scrollHeight - scroller.scrollTop };
+            };
+            const olderObserver = typeof IntersectionObserver === 'function'
+              ? new IntersectionObserver((entries) => {
+                entries.forEach((entry) => {
+                  if (!entry.target.isConnected) {
+                    olderObserver.unobserve(entry.target);
+                  } else if (entry.isIntersecting) {
+                    requestOlder(entry.target);
+                  }
+                });
+              }, { rootMargin: '600px 0px 0px 0px' })
+              : null;
+            const watchOlder = () => {
+              const marker = document.getElementById('cards-older');
+              if (olderPending && (!marker || Number(marker.dataset.before) !== olderPending.before)) {
+                const scroller = document.scrollingElement || document.documentElement;
+                scroller.scrollTop = scroller.scrollHeight - olderPending.fromBottom;
+                olderPending = null;
+              }
+              if (!marker || !olderObserver || marker.__pylogueWatched) return;
+              marker.__pylogueWatched = true;
+              olderObserver.observe(marker);
+            };
+            document.body.addEventListener('htmx:wsAfterMessage', watchOlder);
+            document.body.addEventListener('htmx:afterSwap', watchOlder);
+            document.body.addEventListener('htmx:wsOpen', (event) => {
+              pylogueSocket = (event.detail && event.detail.socketWrapper) || pylogueSocket;
+              olderPending = null;
+              // On reconnect, ask the server (any worker) to restore this tab's conversation.
+              if (pylogueSessionId) {
+                const request = { session: pylogueSessionId };
+                const streamEl = pylogueStream && document.getElementById(pylogueStream.target);
+                if (streamEl) {
+                  request.stream = pylogueStream.id;
+                  request.offset = rawByteLength(streamEl);
+                }
+                sendControlMessage(`${RESUME_PREFIX}${JSON.stringify(request)}`);
+              }
+              delete document.body.dataset.pylogueDraining;
+              if (pendingPrompt !== null) {
+                // The previous server was draining; replay the prompt it handed back.
+                const prompt = pendingPrompt;
+                pendingPrompt = null;
+                if (sendControlMessage(prompt)) setSendMode('stop');
+              }
+            });
+            const rawByteLength = (el) => {
+              if (el.dataset.rawBytes !== undefined) return Number(el.dataset.rawBytes) || 0;
+              const rawB64 = el.getAttribute('data-raw-b64');
+              try {
+                return rawB64 ? atob(rawB64).length : 0;
+              } catch {
+                return 0;
+              }
+            };
+            const rawSource = (el) => {
+              const rawAttr = el.getAttribute('data-raw');
+              if (rawAttr !== null) return rawAttr;
+              return decodeCopyB64(el.getAttribute('data-raw-b64'));
+            };
+            const requestResync = (el) => {
+              const cardId = el.id.replace(/^assistant-/, '');
+              if (el.dataset.resyncPending === 'true') return;
+              if (sendControlMessage(`${RESYNC_PREFIX}${cardId}`)) {
+                el.dataset.resyncPending = 'true';
+              }
+            };
+            const applyDelta = (frame) => {
+              const el = document.getElementById(frame.dataset.target || '');
+              if (!el) return;
+              if (frame.dataset.stream) {
+                pylogueStream = { id: frame.dataset.stream, target: el.id };
+              }
+              const offset = Number(frame.dataset.offset || 0);
+              let binary = '';
+              try {
+                binary = atob(frame.dataset.chunkB64 || '');
+              } catch {
+                return;
+              }
+              const currentBytes = rawByteLength(el);
+              if (offset !== currentBytes) {
+                // Duplicates are dropped; a gap means we missed frames and need a full replace.
+                if (offset + binary.length > currentBytes) requestResync(el);
+                return;
+              }
+              const source = rawSource(el) + decodeBinary(binary);
+              el.setAttribute('data-raw', source);
+              el.removeAttribute('data-raw-b64');
+              el.dataset.rawBytes = String(currentBytes + binary.length);
+              if (typeof window.__pylogueScheduleMarkdown === 'function') {
+                window.__pylogueScheduleMarkdown();
+              } else {
+                el.textContent = source;
+              }
+            };
+            const controlHandlers = {
+              delta: applyDelta,
+              session: (frame) => {
+                pylogueSessionId = frame.dataset.id || null;
+                pylogueExportUrl = frame.dataset.export || pylogueExportUrl;
+                pylogueEmbedsUrl = frame.dataset.embeds || pylogueEmbedsUrl;
+              },
+              import: (frame) => {
+                document.body.dataset.pylogueImport = frame.dataset.state || '';
+                document.body.dispatchEvent(new CustomEvent('pylogue:import-progress', {
+                  detail: { ...frame.dataset },
+                }));
+              },
+              draining: (frame) => {
+                document.body.dataset.pylogueDraining = 'true';
+                if (frame.dataset.promptB64) {
+                  pendingPrompt = decodeCopyB64(frame.dataset.promptB64);
+                  setSendMode('send');
+                }
+              },
+              done: (frame) => {
+                setSendMode('send');
+                document.body.dispatchEvent(new CustomEvent('pylogue:stream-end', {
+                  detail: { card: frame.dataset.card, stream: frame.dataset.stream },
+                }));
+              },
+            };
+            window.__pylogueControlHandlers = controlHandlers;
+            document.body.addEventListener('htmx:wsBeforeMessage', (event) => {
+              const detail = event.detail || {};
+              if (detail.socketWrapper) pylogueSocket = detail.socketWrapper;
+              const message = detail.message;
+              if (typeof message !== 'string' || !message.includes('pylogue-control')) return;
+              const template = document.createElement('template');
+              template.innerHTML = message;
+              const nodes = Array.from(template.content.children);
+              const frames = nodes.filter((node) => node.classList.contains('pylogue-control'));
+              if (!frames.length) return;
+              frames.forEach((frame) => {
+                const handler = controlHandlers[frame.dataset.kind];
+                if (handler) handler(frame);
+              });
+              if (frames.length === nodes.length) event.preventDefault();
+            });
             document.addEventListener('click', async (event) => {
               const btn = event.target.closest('.copy-btn');
               if (!btn) return;
@@ -41,10 +275,9 @@
               if (event.defaultPrevented) return;
               if (document.body?.dataset?.disableCoreDownload === 'true') return;
               console.log('[pylogue-core] download handler fired');
-              const exportInput = document.getElementById('chat-export');
-              const input = exportInput || document.getElementById('chat-data');
-              if (!input) return;
-              const text = input.value || '[]';
+              const payload = await fetchExport();
+              if (!payload) return;
+              const text = JSON.stringify(payload);
               const blob = new Blob([text], { type: 'application/json' });
               const url = URL.createObjectURL(blob);
               const link = document.createElement('a');
@@ -80,8 +313,8 @@
               if (!file) return;
               try {
                 const text = await file.text();
-                const data = JSON.parse(text);
-                const payload = JSON.stringify(data);
+                if (importConversation(text)) return;
+                const payload = JSON.stringify(JSON.parse(text));
                 const msgInput = document.getElementById('msg');
                 const form = document.getElementById('form');
                 if (!msgInput || !form) return;
@@ -117,12 +350,6 @@
               }
               setSendMode('stop');
             });
-            document.body.addEventListener('htmx:afterSwap', (event) => {
-              const target = event.detail && event.detail.target;
-              if (target && target.id === 'chat-export') {
-                setSendMode('send');
-              }
-            });
             document.addEventListener('click', (event) => {
               const btn = event.target.closest('#chat-send-btn');
               if (!btn) return;
@@ -0,0 +1,192 @@
+// Markdown source -> HTML, with no DOM access. pylogue-markdown-worker.js runs this off the main
+// thread; pylogue-markdown.js falls back to it in-page when workers are unavailable.
+
+export const KATEX_DOLLAR_PLACEHOLDER = '@@PYLOGUE_DOLLAR@@';
+
+export const protectEscapedDollars = (md) => {
+    if (!md) return md || '';
+    const blocks = [];
+    const replaceBlock = (match) => {
+        blocks.push(match);
+        return `__PYLOGUE_CODEBLOCK_${blocks.length - 1}__`;
+    };
+    md = md.replace(/(```+|~~~+)[\s\S]*?\1/g, replaceBlock);
+    md = md.replace(/(`+)([^`]*?)\1/g, replaceBlock);
+    md = md.replace(/(\\+)\$/g, (match, slashes) => {
+        return '\\'.repeat(slashes.length - 1) + KATEX_DOLLAR_PLACEHOLDER;
+    });
+    blocks.forEach((block, index) => {
+        md = md.replace(`__PYLOGUE_CODEBLOCK_${index}__`, block);
+    });
+    return md;
+};
+
+export const looksLikeHtmlBlock = (text) => {
+    if (!text) return false;
+    const trimmed = text.trim();
+    if (!trimmed.startsWith('<') || !trimmed.endsWith('>')) return false;
+    return /<\/?[a-zA-Z][\s\S]*?>/.test(trimmed);
+};
+
+export const dedentHtml = (text) => {
+    if (!looksLikeHtmlBlock(text)) return text;
+    const lines = text.split(/\r?\n/);
+    let minIndent = null;
+    lines.forEach((line) => {
+        if (!line.trim()) return;
+        const match = line.match(/^[ \t]+/);
+        if (!match) {
+            minIndent = 0;
+            return;
+        }
+        const indent = match[0].length;
+        if (minIndent === null || indent < minIndent) {
+            minIndent = indent;
+        }
+    });
+    if (!minIndent) return text;
+    const strip = new RegExp(`^[ \\t]{0,${minIndent}}`);
+    return lines.map((line) => line.replace(strip, '')).join('\n');
+};
+
+export const splitDivHtmlBlock = (text) => {
+    if (!text) return null;
+    if (text.includes('```')) return null;
+    const start = text.indexOf('<div');
+    const end = text.lastIndexOf('</div>');
+    if (start === -1 || end === -1 || end <= start) return null;
+    const htmlEnd = end + 6;
+    return {
+        prefix: text.slice(0, start),
+        html: text.slice(start, htmlEnd),
+        suffix: text.slice(htmlEnd),
+    };
+};
+
+// Streaming answers only grow at the end, so each answer is rendered as a list of top-level
+// blocks. Finished blocks are lexed once and keep their id (and so their DOM on the page);
+// only blocks from the first changed one onward are re-parsed. The last markdown token is
+// never final: more text may extend it.
+export const lexSegment = (marked, segment, previous) => {
+    let committed = [];
+    let committedText = '';
+    if (previous && segment.text.startsWith(previous.committedText)) {
+        committed = previous.committed;
+        committedText = previous.committedText;
+    }
+    const tailText = segment.text.slice(committedText.length);
+    const tail = tailText ? marked.lexer(tailText) : [];
+    const covered = tail.reduce((total, token) => total + (token.raw || '').length, 0);
+    if (covered !== tailText.length) {
+        // The lexer normalized something (e.g. CRLF); render this segment whole.
+        return { blocks: [segment.text], state: null };
+    }
+    let last = tail.length - 1;
+    while (last > 0 && tail[last].type === 'space') last -= 1;
+    // A list can still absorb the next block (`3` becomes `3. item`), so keep it open too.
+    let before = last - 1;
+    while (before > 0 && tail[before].type === 'space') before -= 1;
+    if (before >= 0 && tail[before].type === 'list') last = before;
+    const fresh = tail.slice(0, Math.max(last, 0));
+    if (fresh.length) {
+        committed = committed.concat(fresh.filter((token) => token.type !== 'space').map((token) => token.raw));
+        committedText += fresh.map((token) => token.raw).join('');
+    }
+    const open = tail.slice(Math.max(last, 0)).filter((token) => token.type !== 'space');
+    return {
+        blocks: committed.concat(open.map((token) => token.raw)),
+        state: { committed, committedText },
+    };
+};
+
+// Reference-style links and footnotes (`[text][id]` ... `[id]: url`) resolve across the whole
+// answer, but blocks are parsed one by one. When the answer has definitions, they are collected
+// from a lex of the full source and seeded into each block's lexer.
+const DEFINITION_RE = /^ {0,3}\[[^\]\n]+\]:/m;
+
+export const collectLinks = (marked, text) => {
+    if (!DEFINITION_RE.test(text)) return null;
+    const links = marked.lexer(text).links || {};
+    return Object.keys(links).length ? { ...links } : null;
+};
+
+export const parseBlock = (marked, text, links) => {
+    const source = protectEscapedDollars(text);
+    if (!links) return marked.parse(source);
+    const lexer = new marked.Lexer(marked.defaults);
+    Object.assign(lexer.tokens.links, links);
+    return marked.parser(lexer.lex(source));
+};
+
+// Per-card block state keyed by the card element's id. `render` answers with the card's
+// block ids in order plus HTML for the ids the caller does not `have` yet. Ids carry `prefix`,
+// so ids from the worker and from the in-page fallback never collide:
+//   { mode: 'blocks', ids: [...], fresh: { id: html } }  or  { mode: 'html', html }
+export const createMarkdownBlocks = (marked, prefix = 'w') => {
+    const cards = new Map();
+    let nextId = 1;
+
+    const render = (key, source, have = []) => {
+        const normalized = dedentHtml(source);
+        const split = splitDivHtmlBlock(normalized);
+        if (!split && looksLikeHtmlBlock(normalized)) {
+            cards.delete(key);
+            return { mode: 'html', html: normalized };
+        }
+        const segments = [{ start: 0, text: normalized }];
+        if (split) {
+            const htmlStart = split.prefix.length;
+            segments.splice(0, 1,
+                { start: 0, text: split.prefix },
+                { start: htmlStart, text: split.html, html: true },
+                { start: htmlStart + split.html.length, text: split.suffix },
+            );
+        }
+        const card = cards.get(key) || { blocks: [], segments: new Map(), links: null };
+        const markdown = segments.filter((segment) => !segment.html).map((segment) => segment.text);
+        const links = collectLinks(marked, markdown.join('\n\n'));
+        const linksKey = links ? JSON.stringify(links) : null;
+        if (linksKey !== card.links) {
+            // A new definition can change blocks that are already rendered; parse them all again.
+            card.blocks = [];
+            card.links = linksKey;
+        }
+        const wanted = [];
+        const nextSegments = new Map();
+        segments.forEach((segment) => {
+            if (!segment.text) return;
+            if (segment.html) {
+                wanted.push({ key: segment.text, html: true });
+                return;
+            }
+            const lexed = lexSegment(marked, segment, card.segments.get(segment.start));
+            if (lexed.state) nextSegments.set(segment.start, lexed.state);
+            lexed.blocks.forEach((raw) => wanted.push({ key: raw, html: false }));
+        });
+
+        let same = 0;
+        while (
+            same < card.blocks.length
+            && same < wanted.length
+            && card.blocks[same].html === wanted[same].html
+            && card.blocks[same].key === wanted[same].key
+        ) {
+            same += 1;
+        }
+        card.blocks = card.blocks.slice(0, same).concat(
+            wanted.slice(same).map((block) => ({ ...block, id: `${prefix}${nextId++}` })),
+        );
+        card.segments = nextSegments;
+        cards.set(key, card);
+
+        const known = new Set(have);
+        const fresh = {};
+        card.blocks.forEach((block) => {
+            if (known.has(block.id)) return;
+            fresh[block.id] = block.html ? block.key : parseBlock(marked, block.key, links);
+        });
+        return { mode: 'blocks', ids: card.blocks.map((block) => block.id), fresh };
+    };
+
+    return { render, drop: (key) => cards.delete(key) };
+};
@@ -0,0 +1,39 @@
+// Markdown-to-HTML off the main thread for pylogue-markdown.js.
+// Import maps do not apply inside workers, so the page sends resolved module URLs in `init`.
+//   page -> worker: { type: 'init', marked, blocks }
+//                   { type: 'render', seq, key, source, have }
+//                   { type: 'drop', key }
+//   worker -> page: { type: 'rendered', seq, result }  or  { type: 'failed', error }
+
+let ready = null;
+let engine = null;
+
+self.onmessage = async (event) => {
+    const message = event.data || {};
+    if (message.type === 'init') {
+        ready = Promise.all([import(message.marked), import(message.blocks)]).then(([markedModule, blocks]) => {
+            const marked = markedModule.marked || markedModule.default;
+            marked.setOptions({ gfm: true, breaks: true });
+            engine = blocks.createMarkdownBlocks(marked);
+        });
+        ready.catch((err) => self.postMessage({ type: 'failed', error: String(err) }));
+        return;
+    }
+    if (!ready) return;
+    try {
+        // Messages that arrive while the modules load resume in order once they are ready.
+        await ready;
+    } catch {
+        return;
+    }
+    if (message.type === 'drop') {
+        engine.drop(message.key);
+    } else if (message.type === 'render') {
+        try {
+            const result = engine.render(message.key, message.source, message.have);
+            self.postMessage({ type: 'rendered', seq: message.seq, result });
+        } catch (err) {
+            self.postMessage({ type: 'failed', error: String(err) });
+        }
+    }
+};
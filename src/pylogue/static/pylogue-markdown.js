@@ -1,10 +1,61 @@
 
-                import { marked } from "https://cdn.jsdelivr.net/npm/marked/lib/marked.esm.js";
-                marked.setOptions({ gfm: true, breaks: true });
+                import { KATEX_DOLLAR_PLACEHOLDER, createMarkdownBlocks } from "pylogue/markdown-blocks";
+
+                // KaTeX, highlight.js, Vega and mermaid load on first use. The server lists their
+                // URLs (CDN or vendored) in #pylogue-renderers instead of loading them up front.
+                const rendererConfig = (() => {
+                    try {
+                        const el = document.getElementById('pylogue-renderers');
+                        return el ? JSON.parse(el.textContent || '{}') : {};
+                    } catch {
+                        return {};
+                    }
+                })();
+                const loadedAssets = new Map();
+                const loadAsset = (url, isStyle) => {
+                    if (!loadedAssets.has(url)) {
+                        loadedAssets.set(url, new Promise((resolve, reject) => {
+                            const el = document.createElement(isStyle ? 'link' : 'script');
+                            if (isStyle) {
+                                el.rel = 'stylesheet';
+                                el.href = url;
+                            } else {
+                                el.src = url;
+                                el.async = false;
+                            }
+                            el.onload = resolve;
+                            el.onerror = () => {
+                                loadedAssets.delete(url);
+                                reject(new Error(`Failed to load ${url}`));
+                            };
+                            document.head.appendChild(el);
+                        }));
+                    }
+                    return loadedAssets.get(url);
+                };
+                const rendererLoads = new Map();
+                const loadRenderer = (name) => {
+                    if (!rendererLoads.has(name)) {
+                        const spec = rendererConfig[name] || {};
+                        const styles = (spec.css || []).map((url) => loadAsset(url, true));
+                        // Scripts build on each other (auto-render needs katex), so load them in order.
+                        const scripts = (spec.js || []).reduce(
+                            (chain, url) => chain.then(() => loadAsset(url, false)),
+                            Promise.resolve(),
+                        );
+                        const loading = Promise.all([scripts, ...styles]).catch((err) => {
+                            rendererLoads.delete(name);
+                            console.warn(`[pylogue] ${name} failed to load`, err);
+                            throw err;
+                        });
+                        rendererLoads.set(name, loading);
+                    }
+                    return rendererLoads.get(name);
+                };
+                window.__pylogueLoadRenderer = loadRenderer;
 
                 let markdownRendering = false;
                 let pendingScrollState = null;
-                const KATEX_DOLLAR_PLACEHOLDER = '@@PYLOGUE_DOLLAR@@';
 
                 const getScrollState = () => {
                     const scrollElement = document.scrollingElement || document.documentElement;
@@ -87,66 +138,6 @@
                     }
                 };
 
-                const protectEscapedDollars = (md) => {
-                    if (!md) return md || '';
-                    const blocks = [];
-                    const replaceBlock = (match) => {
-                        blocks.push(match);
-                        return `__PYLOGUE_CODEBLOCK_${blocks.length - 1}__`;
-                    };
-                    md = md.replace(/(```+|~~~+)[\s\S]*?\1/g, replaceBlock);
-                    md = md.replace(/(`+)([^`]*?)\1/g, replaceBlock);
-                    md = md.replace(/(\\+)\$/g, (match, slashes) => {
-                        return '\\'.repeat(slashes.length - 1) + KATEX_DOLLAR_PLACEHOLDER;
-                    });
-                    blocks.forEach((block, index) => {
-                        md = md.replace(`__PYLOGUE_CODEBLOCK_${index}__`, block);
-                    });
-                    return md;
-                };
-
-                const looksLikeHtmlBlock = (text) => {
-                    if (!text) return false;
-                    const trimmed = text.trim();
-                    if (!trimmed.startsWith('<') || !trimmed.endsWith('>')) return false;
-                    return /<\/?[a-zA-Z][\s\S]*?>/.test(trimmed);
-                };
-
-                const dedentHtml = (text) => {
-                    if (!looksLikeHtmlBlock(text)) return text;
-                    const lines = text.split(/\r?\n/);
-                    let minIndent = null;
-                    lines.forEach((line) => {
-                        if (!line.trim()) return;
-                        const match = line.match(/^[ \t]+/);
-                        if (!match) {
-                            minIndent = 0;
-                            return;
-                        }
-                        const indent = match[0].length;
-                        if (minIndent === null || indent < minIndent) {
-                            minIndent = indent;
-                        }
-                    });
-                    if (!minIndent) return text;
-                    const strip = new RegExp(`^[ \\t]{0,${minIndent}}`);
-                    return lines.map((line) => line.replace(strip, '')).join('\n');
-                };
-
-                const splitDivHtmlBlock = (text) => {
-                    if (!text) return null;
-                    if (text.includes('```')) return null;
-                    const start = text.indexOf('<div');
-                    const end = text.lastIndexOf('</div>');
-                    if (start === -1 || end === -1 || end <= start) return null;
-                    const htmlEnd = end + 6;
-                    return {
-                        prefix: text.slice(0, start),
-                        html: text.slice(start, htmlEnd),
-                        suffix: text.slice(htmlEnd),
-                    };
-                };
-
                 const replaceDollarPlaceholders = (root) => {
                     const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
                     const nodes = [];
@@ -163,8 +154,21 @@
                     });
                 };
 
+                const MATH_HINT_RE = /\$|\\\(|\\\[/;
                 const renderMath = (root) => {
-                    if (typeof renderMathInElement !== 'function') return;
+                    if (typeof renderMathInElement !== 'function') {
+                        if (!MATH_HINT_RE.test(root.textContent || '')) {
+                            replaceDollarPlaceholders(root);
+                            return;
+                        }
+                        loadRenderer('katex').then(
+                            () => (typeof renderMathInElement === 'function'
+                                ? renderMath(root)
+                                : replaceDollarPlaceholders(root)),
+                            () => replaceDollarPlaceholders(root),
+                        );
+                        return;
+                    }
                     renderMathInElement(root, {
                         delimiters: [
                             { left: '$$', right: '$$', display: true },
@@ -177,8 +181,15 @@
                 };
 
                 const highlightCode = (root) => {
-                    if (!window.hljs || typeof window.hljs.highlightElement !== 'function') return;
-                    const blocks = root.querySelectorAll('pre code');
+                    const blocks = root.querySelectorAll(
+                        'pre code:not(.language-mermaid):not(.language-vega-lite):not(.language-vega)',
+                    );
+                    if (!window.hljs || typeof window.hljs.highlightElement !== 'function') {
+                        if (blocks.length) {
+                            loadRenderer('hljs').then(() => window.hljs && highlightCode(root), () => {});
+                        }
+                        return;
+                    }
                     blocks.forEach((block) => {
                         if (block.dataset.hljsApplied === 'true') return;
                         window.hljs.highlightElement(block);
@@ -186,6 +197,43 @@
                     });
                 };
 
+                // ```vega-lite / ```vega fences become charts once the spec parses (i.e. the fence is
+                // complete). Views are kept per answer so re-renders during streaming reuse them.
+                const vegaViews = new WeakMap();
+                const renderVegaBlocks = (root) => {
+                    const blocks = root.querySelectorAll('pre > code.language-vega-lite, pre > code.language-vega');
+                    blocks.forEach((code) => {
+                        const text = code.textContent || '';
+                        let spec;
+                        try {
+                            spec = JSON.parse(text);
+                        } catch {
+                            return;
+                        }
+                        const pre = code.parentElement;
+                        const owner = code.closest('.marked') || document.body;
+                        if (!vegaViews.has(owner)) vegaViews.set(owner, new Map());
+                        const views = vegaViews.get(owner);
+                        const existing = views.get(text);
+                        if (existing) {
+                            pre.replaceWith(existing);
+                            return;
+                        }
+                        const host = document.createElement('div');
+                        host.className = 'pylogue-vega';
+                        pre.replaceWith(host);
+                        views.set(text, host);
+                        loadRenderer('vega')
+                            .then(() => window.vegaEmbed(host, spec, { actions: false }))
+                            .then((result) => { host.__pylogueVega = result; })
+                            .catch((err) => {
+                                views.delete(text);
+                                host.textContent = 'Chart failed to render.';
+                                console.warn('[vega] render failed', err);
+                            });
+                    });
+                };
+
                 const addCopyButtons = (root) => {
                     const blocks = root.querySelectorAll('pre');
                     blocks.forEach((pre) => {
@@ -227,63 +275,311 @@
                     });
                 };
 
+                // Markdown is parsed in a Web Worker (pylogue-markdown-worker.js) so long answers do
+                // not stall scrolling and typing. The worker keeps each card's lexed blocks and answers
+                // with block ids plus HTML for the blocks this page does not have yet. A card has at
+                // most one request in flight; text that arrives meanwhile is sent when it returns, and
+                // answers for cards that were replaced in the meantime are dropped.
+                const moduleUrl = (specifier) => {
+                    try {
+                        const map = JSON.parse(document.querySelector('script[type="importmap"]').textContent);
+                        return new URL(map.imports[specifier], document.baseURI).href;
+                    } catch {
+                        return null;
+                    }
+                };
+
+                const inPageEngine = () => {
+                    const loading = import('marked').then(({ marked }) => {
+                        marked.setOptions({ gfm: true, breaks: true });
+                        return createMarkdownBlocks(marked, 'p');
+                    });
+                    return {
+                        render: (key, source, have) => loading.then((blocks) => blocks.render(key, source, have)),
+                        drop: (key) => { loading.then((blocks) => blocks.drop(key), () => {}); },
+                    };
+                };
+
+                const workerEngine = () => {
+                    const configEl = document.getElementById('pylogue-renderers');
+                    const workerUrl = configEl && configEl.dataset.worker;
+                    const markedUrl = moduleUrl('marked');
+                    const blocksUrl = moduleUrl('pylogue/markdown-blocks');
+                    if (typeof Worker !== 'function' || !workerUrl || !markedUrl || !blocksUrl) return null;
+                    let worker;
+                    try {
+                        worker = new Worker(new URL(workerUrl, document.baseURI), { type: 'module' });
+                    } catch {
+                        return null;
+                    }
+                    const pending = new Map();
+                    let seq = 0;
+                    let fallback = null;
+                    const useFallback = (err) => {
+                        if (fallback) return;
+                        console.warn('[pylogue] markdown worker unavailable; parsing on the page', err);
+                        worker.terminate();
+                        fallback = inPageEngine();
+                        pending.forEach((job) => {
+                            fallback.render(job.key, job.source, job.have).then(job.resolve, job.reject);
+                        });
+                        pending.clear();
+                    };
+                    worker.onmessage = (event) => {
+                        const message = event.data || {};
+                        if (message.type === 'failed') {
+                            useFallback(message.error);
+                            return;
+                        }
+                        const job = pending.get(message.seq);
+                        if (!job) return;
+                        pending.delete(message.seq);
+                        job.resolve(message.result);
+                    };
+                    worker.onerror = (event) => useFallback(event.message || event);
+                    worker.postMessage({ type: 'init', marked: markedUrl, blocks: blocksUrl });
+                    return {
+                        render: (key, source, have) => {
+                            if (fallback) return fallback.render(key, source, have);
+                            return new Promise((resolve, reject) => {
+                                seq += 1;
+                                pending.set(seq, { key, source, have, resolve, reject });
+                                worker.postMessage({ type: 'render', seq, key, source, have });
+                            });
+                        },
+                        drop: (key) => {
+                            if (fallback) fallback.drop(key);
+                            else worker.postMessage({ type: 'drop', key });
+                        },
+                    };
+                };
+
+                const markdownEngine = workerEngine() || inPageEngine();
+
+                let markdownKeys = 0;
+                const markdownKey = (el) => {
+                    if (!el.__pylogueKey) {
+                        markdownKeys += 1;
+                        el.__pylogueKey = el.id || `pylogue-md-${markdownKeys}`;
+                    }
+                    return el.__pylogueKey;
+                };
+
+                const markdownSource = (el) => {
+                    const rawB64 = el.getAttribute('data-raw-b64');
+                    const rawAttr = el.getAttribute('data-raw');
+                    return rawB64 ? decodeB64(rawB64) : (rawAttr !== null ? rawAttr : el.textContent);
+                };
+
+                // Blocks are separated by comment markers, so a finished block keeps its DOM (and
+                // KaTeX/highlight work) while later ones are replaced. Returns the added nodes, or
+                // null if the page lost blocks the worker assumed it still had.
+                const applyBlocks = (el, result) => {
+                    let state = el.__pylogueBlocks;
+                    if (state && state.blocks.length && state.blocks[0].marker.parentNode !== el) {
+                        // Something replaced the content behind our back; start over.
+                        state = null;
+                    }
+                    if (!state) {
+                        state = { blocks: [] };
+                        el.__pylogueBlocks = state;
+                    }
+                    let same = 0;
+                    while (
+                        same < state.blocks.length
+                        && same < result.ids.length
+                        && state.blocks[same].id === result.ids[same]
+                    ) {
+                        same += 1;
+                    }
+                    if (!result.ids.slice(same).every((id) => id in result.fresh)) {
+                        el.__pylogueBlocks = null;
+                        return null;
+                    }
+                    if (!state.blocks.length) {
+                        el.textContent = '';
+                    } else if (same < state.blocks.length) {
+                        const marker = state.blocks[same].marker;
+                        while (marker.nextSibling) marker.nextSibling.remove();
+                        marker.remove();
+                        state.blocks.length = same;
+                    }
+                    const added = [];
+                    result.ids.slice(same).forEach((id) => {
+                        const marker = document.createComment('md');
+                        const template = document.createElement('template');
+                        template.innerHTML = result.fresh[id];
+                        added.push(...template.content.childNodes);
+                        el.append(marker, template.content);
+                        state.blocks.push({ id, marker });
+                    });
+                    return added;
+                };
+
+                const applyMarkdown = (el, result) => {
+                    markdownRendering = true;
+                    let added = [];
+                    if (result.mode === 'html') {
+                        el.__pylogueBlocks = null;
+                        el.innerHTML = result.html;
+                    } else {
+                        added = applyBlocks(el, result);
+                    }
+                    markdownRendering = false;
+                    if (added === null) return false;
+                    const row = el.closest('.chat-row-block');
+                    if (row && row.dataset.virtualHeight) {
+                        // Back from a collapsed placeholder: let the content size the row again.
+                        row.style.height = '';
+                        delete row.dataset.virtualHeight;
+                    }
+                    if (added.length) {
+                        added.forEach((node) => {
+                            if (node.nodeType === Node.ELEMENT_NODE) renderMath(node);
+                        });
+                        highlightCode(el);
+                        addCopyButtons(el);
+                    }
+                    renderVegaBlocks(el);
+                    if (window.__upgradeMermaidBlocks) {
+                        window.__upgradeMermaidBlocks(el);
+                    }
+                    if (window.__applyToolStatusUpdates) {
+                        window.__applyToolStatusUpdates(el);
+                    }
+                    if (window.__pylogueHydrateEmbeds) {
+                        window.__pylogueHydrateEmbeds(el);
+                    }
+                    return true;
+                };
+
+                // Only streaming answers (those that received deltas) keep block state in the
+                // worker, and only until their stream ends.
+                const keepsBlockState = (el) => el.dataset.rawBytes !== undefined && !el.__pylogueStreamDone;
+
+                const sendMarkdown = (el, source) => {
+                    const job = { next: null };
+                    el.__pylogueJob = job;
+                    const key = markdownKey(el);
+                    const state = el.__pylogueBlocks;
+                    const have = state ? state.blocks.map((block) => block.id) : [];
+                    markdownEngine.render(key, source, have).then((result) => {
+                        if (el.__pylogueJob !== job) return;
+                        el.__pylogueJob = null;
+                        if (!el.isConnected) return;
+                        const applied = applyMarkdown(el, result);
+                        if (job.next !== null && job.next !== source) {
+                            sendMarkdown(el, job.next);
+                        } else if (!applied) {
+                            sendMarkdown(el, source);
+                        } else if (!keepsBlockState(el)) {
+                            markdownEngine.drop(key);
+                        }
+                    }, (err) => {
+                        if (el.__pylogueJob === job) el.__pylogueJob = null;
+                        console.warn('[pylogue] markdown render failed', err);
+                    });
+                };
+
+                // Long chats only keep rows near the viewport rendered. A row that scrolls far away
+                // keeps its height as a placeholder but drops its rendered markdown (charts,
+                // diagrams, KaTeX); it is rendered again from its raw source when it comes back.
+                const nearRows = new WeakSet();
+                const releaseMarkdown = (el) => {
+                    el.querySelectorAll('.pylogue-vega').forEach((host) => {
+                        if (host.__pylogueVega) host.__pylogueVega.finalize();
+                    });
+                    el.querySelectorAll('.mermaid-wrapper').forEach((wrapper) => {
+                        delete mermaidStates[wrapper.id];
+                    });
+                    vegaViews.delete(el);
+                    markdownEngine.drop(markdownKey(el));
+                    el.__pylogueBlocks = null;
+                    el.__pylogueJob = null;
+                    delete el.dataset.renderedSource;
+                    el.textContent = '';
+                };
+                const collapseRow = (row) => {
+                    const rendered = Array.from(row.querySelectorAll('.marked'))
+                        .filter((el) => el.dataset.renderedSource !== undefined);
+                    if (!rendered.length) return;
+                    if (!row.dataset.virtualHeight) {
+                        row.dataset.virtualHeight = String(row.getBoundingClientRect().height);
+                        row.style.height = `${row.dataset.virtualHeight}px`;
+                    }
+                    rendered.forEach(releaseMarkdown);
+                };
+                const rowObserver = typeof IntersectionObserver === 'function'
+                    ? new IntersectionObserver((entries) => {
+                        let changed = false;
+                        entries.forEach((entry) => {
+                            const row = entry.target;
+                            if (!row.isConnected) {
+                                rowObserver.unobserve(row);
+                            } else if (entry.isIntersecting) {
+                                changed = changed || !nearRows.has(row);
+                                nearRows.add(row);
+                            } else if (nearRows.has(row)) {
+                                nearRows.delete(row);
+                                collapseRow(row);
+                            }
+                        });
+                        if (changed) scheduleRender();
+                    }, { rootMargin: '150% 0px' })
+                    : null;
+                // Chat rows render once they are near the viewport; other `.marked` content always does.
+                const isRenderable = (el) => {
+                    const row = rowObserver && el.closest('.chat-row-block');
+                    if (!row) return true;
+                    if (!row.__pylogueObserved) {
+                        row.__pylogueObserved = true;
+                        rowObserver.observe(row);
+                    }
+                    return nearRows.has(row);
+                };
+
                 const renderMarkdown = (root = document) => {
                     const nodes = root.querySelectorAll('.marked');
-                    if (!marked || typeof marked.parse !== 'function') return;
                     if (nodes.length === 0) return;
-                    markdownRendering = true;
                     nodes.forEach((el) => {
-                        const rawB64 = el.getAttribute('data-raw-b64');
-                        const rawAttr = el.getAttribute('data-raw');
-                        const source = rawB64 ? decodeB64(rawB64) : (rawAttr !== null ? rawAttr : el.textContent);
+                        if (!isRenderable(el)) return;
+                        const source = markdownSource(el);
                         if (el.dataset.renderedSource === source) return;
                         if (el.dataset.mermaidDirty === 'true') return;
-                        const normalizedSource = dedentHtml(source);
-                        const split = splitDivHtmlBlock(normalizedSource);
-                        if (split) {
-                            const safePrefix = protectEscapedDollars(split.prefix);
-                            const safeSuffix = protectEscapedDollars(split.suffix);
-                            const prefixHtml = safePrefix ? marked.parse(safePrefix) : '';
-                            const suffixHtml = safeSuffix ? marked.parse(safeSuffix) : '';
-                            el.innerHTML = `${prefixHtml}${split.html}${suffixHtml}`;
-                            renderMath(el);
-                            highlightCode(el);
-                            addCopyButtons(el);
-                            el.dataset.renderedSource = source;
-                            return;
-                        }
-                        if (looksLikeHtmlBlock(normalizedSource)) {
-                            el.innerHTML = normalizedSource;
+                        el.dataset.renderedSource = source;
+                        if (el.__pylogueJob) {
+                            el.__pylogueJob.next = source;
                         } else {
-                            const safeSource = protectEscapedDollars(normalizedSource);
-                            el.innerHTML = marked.parse(safeSource);
-                            renderMath(el);
-                            highlightCode(el);
-                            addCopyButtons(el);
+                            sendMarkdown(el, source);
                         }
-                        el.dataset.renderedSource = source;
                     });
-                    markdownRendering = false;
-                    if (window.__upgradeMermaidBlocks) {
-                        window.__upgradeMermaidBlocks(root);
-                    }
-                    if (window.__applyToolStatusUpdates) {
-                        window.__applyToolStatusUpdates(root);
+                };
+
+                document.body.addEventListener('pylogue:stream-end', (event) => {
+                    const card = event.detail && event.detail.card;
+                    const el = card ? document.getElementById(`assistant-${card}`) : null;
+                    if (!el) return;
+                    el.__pylogueStreamDone = true;
+                    // Otherwise the last in-flight render drops the state once it lands.
+                    if (!el.__pylogueJob && el.dataset.renderedSource === markdownSource(el)) {
+                        markdownEngine.drop(markdownKey(el));
                     }
+                });
+
+                let renderTimer = null;
+                const scheduleRender = () => {
+                    if (markdownRendering) return;
+                    if (renderTimer) return;
+                    renderTimer = requestAnimationFrame(() => {
+                        renderTimer = null;
+                        renderMarkdown(document);
+                    });
                 };
+                window.__pylogueScheduleMarkdown = scheduleRender;
 
                 const observeMarkdown = () => {
                     const target = document.body;
                     if (!target) return;
-                    let renderTimer = null;
-                    const scheduleRender = () => {
-                        if (markdownRendering) return;
-                        if (renderTimer) return;
-                        renderTimer = requestAnimationFrame(() => {
-                            renderTimer = null;
-                            renderMarkdown(document);
-                        });
-                    };
                     const observer = new MutationObserver((mutations) => {
                         for (const mutation of mutations) {
                             if (mutation.type !== 'characterData') continue;
@@ -375,21 +671,22 @@
                 
 
 
-                import mermaid from 'https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.esm.min.mjs';
-
                 let mermaidReady = false;
                 let mermaidCounter = 0;
                 const mermaidStates = {};
                 const mermaidCache = new Map();
                 const mermaidRenderPromises = new Map();
 
-                const ensureMermaid = () => {
-                    if (mermaidReady) return;
-                    mermaid.initialize({
-                        startOnLoad: false,
-                        suppressErrorRendering: true,
-                    });
-                    mermaidReady = true;
+                const ensureMermaid = async () => {
+                    await loadRenderer('mermaid');
+                    if (!mermaidReady) {
+                        window.mermaid.initialize({
+                            startOnLoad: false,
+                            suppressErrorRendering: true,
+                        });
+                        mermaidReady = true;
+                    }
+                    return window.mermaid;
                 };
 
                 const hashMermaidCode = (text) => {
@@ -580,10 +877,9 @@
                     }
                     const renderId = `${hashMermaidCode(codeText)}-${Date.now()}-${Math.floor(Math.random() * 1000)}`;
                     wrapper.dataset.mermaidRendering = 'true';
-                    ensureMermaid();
                     let promise = mermaidRenderPromises.get(codeText);
                     if (!promise) {
-                        promise = mermaid.render(renderId, codeText);
+                        promise = ensureMermaid().then((mermaid) => mermaid.render(renderId, codeText));
                         mermaidRenderPromises.set(codeText, promise);
                     }
                     try {
@@ -0,0 +1,139 @@
+"""Tests for the fingerprinted static assets in `pylogue.assets`."""
+
+import gzip
+
+import pytest
+from starlette.requests import Request
+
+from pylogue import assets
+from pylogue.assets import (
+    RENDERERS,
+    VENDOR_FILES,
+    VENDOR_MODULES,
+    VENDOR_PAGE,
+    VENDOR_THEME,
+    _accepted_encodings,
+    _make_asset,
+    asset_response,
+    core_asset,
+    import_map,
+    renderer_config,
+)
+
+
+def _request(**headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+@pytest.fixture
+def asset():
+    return _make_asset("app.js", b"console.log('pylogue');\n" * 200)
+
+
+def test_fingerprinted_url_and_etag(asset):
+    assert asset.url == f"/static/app.{asset.digest[:12]}.js"
+    assert asset.etag == f'W/"{asset.digest[:32]}"'
+    assert asset.media_type == "text/javascript"
+
+
+def test_full_response_is_immutable(asset):
+    response = asset_response(_request(), asset)
+    assert response.status_code == 200
+    assert response.body == asset.body
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["etag"] == asset.etag
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in response.headers
+    assert asset_response(_request(), asset, immutable=False).headers["cache-control"] == "no-cache"
+
+
+@pytest.mark.parametrize("tag", ["strong", "weak", "list", "star"])
+def test_matching_etag_is_not_modified(asset, tag):
+    value = {
+        "strong": asset.etag.removeprefix("W/"),
+        "weak": asset.etag,
+        "list": f'"other", {asset.etag}',
+        "star": "*",
+    }[tag]
+    response = asset_response(_request(if_none_match=value), asset)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == asset.etag
+
+
+def test_stale_etag_gets_the_body(asset):
+    assert asset_response(_request(if_none_match='W/"stale"'), asset).status_code == 200
+
+
+def test_gzip_negotiation(asset):
+    response = asset_response(_request(accept_encoding="gzip, deflate"), asset)
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == asset.body
+
+
+def test_brotli_is_preferred_when_available(asset):
+    brotli = pytest.importorskip("brotli")
+    response = asset_response(_request(accept_encoding="gzip, br"), asset)
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(response.body) == asset.body
+
+
+def test_refused_encodings_fall_back_to_identity(asset):
+    response = asset_response(_request(accept_encoding="gzip;q=0, br; q=0.0"), asset)
+    assert "content-encoding" not in response.headers
+    assert response.body == asset.body
+
+
+def test_accepted_encodings():
+    assert _accepted_encodings("") == set()
+    assert _accepted_encodings("GZIP, br;q=0.5") == {"gzip", "br"}
+    assert _accepted_encodings("gzip;q=0, br;q=0.000, identity") == {"identity"}
+    assert _accepted_encodings("gzip; q=0.01") == {"gzip"}
+
+
+def test_incompressible_asset_has_no_encodings():
+    assert _make_asset("tiny.css", b"a{}").encoded == ()
+
+
+def test_cdn_renderer_config_and_import_map():
+    config = renderer_config()
+    assert set(config) == set(RENDERERS)
+    assert config["katex"]["js"] == list(RENDERERS["katex"]["js"].values())
+    assert config["mermaid"] == {"js": list(RENDERERS["mermaid"]["js"].values())}
+    imports = import_map()["imports"]
+    assert imports["marked"].startswith("https://")
+    assert imports["pylogue/markdown-blocks"] == core_asset("pylogue-markdown-blocks.js").url
+
+
+@pytest.fixture
+def vendored(tmp_path, monkeypatch):
+    for name in [*VENDOR_FILES, *VENDOR_MODULES, *VENDOR_THEME, *VENDOR_PAGE]:
+        (tmp_path / name).write_text(f"/* {name} */ url(fonts/KaTeX_Main.woff2)", encoding="utf-8")
+    monkeypatch.setenv("PYLOGUE_VENDOR_DIR", str(tmp_path))
+    for cached in (assets.vendor_bundle, assets.vendor_module, assets.vendor_file):
+        cached.cache_clear()
+    yield tmp_path
+    for cached in (assets.vendor_bundle, assets.vendor_module, assets.vendor_file):
+        cached.cache_clear()
+
+
+def test_vendored_renderer_config_and_import_map(vendored):
+    config = renderer_config(vendored=True)
+    assert set(config) == set(RENDERERS)
+    for name, spec in RENDERERS.items():
+        for kind in spec:
+            assert config[name][kind] == [assets.vendor_bundle(name, kind).url]
+            assert config[name][kind][0].startswith(f"/static/pylogue-{name}.")
+    # KaTeX fonts are pointed at the vendor file route.
+    assert b"url(/static/vendor/fonts/KaTeX_Main.woff2)" in assets.vendor_bundle("katex", "css").body
+    imports = import_map(vendored=True)["imports"]
+    assert imports["marked"].startswith("/static/vendor/marked.")
+    assert imports["pylogue/markdown-blocks"] == core_asset("pylogue-markdown-blocks.js").url
+
+
+def test_vendored_config_needs_the_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYLOGUE_VENDOR_DIR", str(tmp_path))
+    assets.vendor_bundle.cache_clear()
+    with pytest.raises(RuntimeError, match="pylogue vendor"):
+        renderer_config(vendored=True)
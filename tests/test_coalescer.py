@@ -0,0 +1,62 @@
+"""Tests for the streamed-chunk coalescer in `pylogue.core`."""
+
+import asyncio
+
+from pylogue.core import _FLUSH_MARKERS, _ChunkCoalescer
+
+
+def _run(interval, max_bytes, steps):
+    """Feed `steps` (chunks, or float pauses) to a coalescer; return the flushed texts."""
+
+    async def run():
+        flushed = []
+
+        async def flush(text):
+            flushed.append(text)
+
+        coalescer = _ChunkCoalescer(flush, interval=interval, max_bytes=max_bytes)
+        for step in steps:
+            if isinstance(step, float):
+                await asyncio.sleep(step)
+            else:
+                await coalescer.add(step)
+        await coalescer.flush()
+        return flushed
+
+    return asyncio.run(run())
+
+
+def test_small_chunks_flush_together_after_the_interval():
+    flushed = _run(0.02, 4096, ["a", "b", "c", 0.06, "d", "e"])
+    assert flushed == ["abc", "de"]
+
+
+def test_byte_threshold_flushes_immediately():
+    flushed = _run(10.0, 4, ["ab", "cd", "e", "fghij", "k"])
+    assert flushed == ["abcd", "efghij", "k"]
+
+
+def test_tool_marker_flushes_immediately():
+    marker = _FLUSH_MARKERS[0]
+    flushed = _run(10.0, 4096, ["thinking", f"tool {marker}", "after"])
+    assert flushed == [f"thinkingtool {marker}", "after"]
+
+
+def test_zero_interval_passes_chunks_through():
+    assert _run(0, 4096, ["a", "", "b"]) == ["a", "b"]
+
+
+def test_final_flush_cancels_the_timer():
+    async def run():
+        flushed = []
+
+        async def flush(text):
+            flushed.append(text)
+
+        coalescer = _ChunkCoalescer(flush, interval=0.02)
+        await coalescer.add("tail")
+        await coalescer.flush()
+        await asyncio.sleep(0.05)
+        return flushed
+
+    assert asyncio.run(run()) == ["tail"]
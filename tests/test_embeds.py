@@ -0,0 +1,113 @@
+"""Tests for the `pylogue.embeds` stores and the `/embeds/{token}` route."""
+
+import json
+import re
+import time
+
+import pytest
+
+from pylogue.embeds import (
+    InMemoryEmbedStore,
+    RedisEmbedStore,
+    SQLiteEmbedStore,
+    configure_embed_store,
+    embed_placeholder,
+    embed_tokens,
+    store_html,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def make_store(request, tmp_path):
+    def _make(ttl=60):
+        if request.param == "memory":
+            return InMemoryEmbedStore(ttl=ttl)
+        if request.param == "sqlite":
+            return SQLiteEmbedStore(tmp_path / "embeds.db", ttl=ttl)
+        fakeredis = pytest.importorskip("fakeredis")
+        return RedisEmbedStore(fakeredis.FakeRedis(), ttl=ttl)
+
+    return _make
+
+
+def test_references_are_counted(make_store):
+    store = make_store()
+    store.put("t", "<b>chart</b>")
+    store.put("t", "<b>chart</b>")
+    assert store.get("t") == "<b>chart</b>"
+    assert store.pop("t") == "<b>chart</b>"
+    # One reference is left, so the HTML survives the first pop.
+    assert store.get("t") == "<b>chart</b>"
+    assert store.pop("t") == "<b>chart</b>"
+    assert store.get("t") is None
+    assert store.pop("t") is None
+
+
+def test_entries_expire(make_store):
+    store = make_store(ttl=0.05)
+    store.put("t", "<b>chart</b>")
+    assert store.get("t") == "<b>chart</b>"
+    time.sleep(0.1)
+    assert store.get("t") is None
+    assert store.pop("t") is None
+    # An expired token starts over with the new HTML and a single reference.
+    store.put("t", "<i>new</i>")
+    assert store.pop("t") == "<i>new</i>"
+    assert store.get("t") is None
+
+
+def test_in_memory_byte_cap_evicts_oldest():
+    store = InMemoryEmbedStore(max_bytes=10)
+    store.put("a", "x" * 4)
+    store.put("b", "y" * 4)
+    store.put("c", "z" * 4)
+    assert store.get("a") is None
+    assert (store.get("b"), store.get("c")) == ("y" * 4, "z" * 4)
+    assert len(store) == 2
+
+
+def test_in_memory_entry_cap_evicts_oldest():
+    store = InMemoryEmbedStore(max_entries=2)
+    for token in ("a", "b", "c"):
+        store.put(token, token)
+    # Reading "b" moves it to the back, so "c" goes next.
+    store.get("b")
+    store.put("d", "d")
+    assert [store.get(token) for token in "abcd"] == [None, "b", None, "d"]
+
+
+def test_embed_tokens_counts_each_placeholder():
+    text = f"a {embed_placeholder('x')} b {embed_placeholder('x')} {embed_placeholder('y')}"
+    assert embed_tokens(text) == ["x", "x", "y"]
+    assert embed_tokens("no embeds") == []
+
+
+def test_route_serves_only_the_referencing_session():
+    from fasthtml.common import FastHTML
+    from starlette.testclient import TestClient
+
+    from pylogue.core import register_ws_routes
+
+    configure_embed_store(InMemoryEmbedStore())
+    html = "<iframe>" + "x" * 100 + "</iframe>"
+    token = store_html(html)
+    unrelated = store_html("<i>someone else's chart</i>")
+
+    async def responder(msg, context=None):
+        yield "chart: " + embed_placeholder(token)
+
+    app = FastHTML(exts="ws")
+    register_ws_routes(app, responder=responder, base_path="/chat")
+    client = TestClient(app)
+    try:
+        with client.websocket_connect("/chat/ws") as ws:
+            session_id = re.search(r'data-id="([^"]+)"', ws.receive_text()).group(1)
+            ws.send_text(json.dumps({"msg": "hi"}))
+            while 'data-kind="done"' not in ws.receive_text():
+                pass
+            assert client.get(f"/chat/embeds/{token}?session={session_id}").text == html
+            assert client.get(f"/chat/embeds/{token}").status_code == 404
+            assert client.get(f"/chat/embeds/{token}?session=other").status_code == 404
+            assert client.get(f"/chat/embeds/{unrelated}?session={session_id}").status_code == 404
+    finally:
+        configure_embed_store(None)
@@ -0,0 +1,77 @@
+"""Tests for the on-demand `/export` route registered by `register_ws_routes`."""
+
+import json
+import re
+
+import pytest
+from fasthtml.common import FastHTML
+from starlette.testclient import TestClient
+
+from pylogue.core import register_ws_routes
+from pylogue.sessions import InMemorySessionStore
+
+
+class _Responder:
+    def __call__(self, message, context=None):
+        return f"<b>re: {message}</b>"
+
+    def get_export_state(self):
+        return {"system_prompt": "be brief"}
+
+
+@pytest.fixture
+def chat():
+    app = FastHTML(exts="ws")
+    store = InMemorySessionStore()
+    register_ws_routes(app, responder=_Responder(), base_path="/chat", session_store=store, resume_grace=60)
+    client = TestClient(app)
+    with client.websocket_connect("/chat/ws") as ws:
+        session_id = re.search(r'data-id="([^"]+)"', ws.receive_text()).group(1)
+        for prompt in ("one", "two"):
+            ws.send_text(json.dumps({"msg": prompt}))
+            while 'data-kind="done"' not in ws.receive_text():
+                pass
+        yield client, session_id
+
+
+def test_exports_the_whole_session(chat):
+    client, session_id = chat
+    payload = client.get("/chat/export", params={"session": session_id}).json()
+    assert [(card["id"], card["question"]) for card in payload["cards"]] == [("0", "one"), ("1", "two")]
+    assert payload["cards"][1]["answer"] == "<b>re: two</b>"
+    assert payload["cards"][1]["answer_text"] == "re: two"
+    assert payload["meta"] == {"system_prompt": "be brief"}
+
+
+def test_exports_one_card(chat):
+    client, session_id = chat
+    payload = client.get("/chat/export", params={"session": session_id, "card": "1"}).json()
+    assert [card["question"] for card in payload["cards"]] == ["two"]
+    assert "history" not in payload
+    assert payload["meta"] == {"system_prompt": "be brief"}
+
+
+def test_unknown_session_or_card_is_not_found(chat):
+    client, session_id = chat
+    assert client.get("/chat/export", params={"session": "nope"}).status_code == 404
+    assert client.get("/chat/export").status_code == 404
+    assert client.get("/chat/export", params={"session": session_id, "card": "9"}).status_code == 404
+
+
+def test_disconnected_session_exports_from_the_store():
+    # The stored copy outlives the socket for `resume_grace`.
+    app = FastHTML(exts="ws")
+    store = InMemorySessionStore()
+    register_ws_routes(app, responder=_Responder(), base_path="/chat", session_store=store, resume_grace=60)
+    client = TestClient(app)
+    with client.websocket_connect("/chat/ws") as ws:
+        session_id = re.search(r'data-id="([^"]+)"', ws.receive_text()).group(1)
+        ws.send_text(json.dumps({"msg": "one"}))
+        while 'data-kind="done"' not in ws.receive_text():
+            pass
+    payload = client.get("/chat/export", params={"session": session_id}).json()
+    assert [card["question"] for card in payload["cards"]] == ["one"]
+    assert "stream" not in payload
+    one = client.get("/chat/export", params={"session": session_id, "card": "0"}).json()
+    assert [card["question"] for card in one["cards"]] == ["one"]
+    assert client.get("/chat/export", params={"session": session_id, "card": "5"}).status_code == 404
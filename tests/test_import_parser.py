@@ -0,0 +1,73 @@
+"""Tests for the incremental import parser in `pylogue.core`."""
+
+import json
+import random
+
+import pytest
+
+from pylogue.core import _ImportParser
+
+
+def _payload():
+    cards = [
+        {"id": str(i), "question": f"q {i} é漢", "answer": 'say "}]," \\ ' + "x" * (i * 7)}
+        for i in range(12)
+    ]
+    return {
+        "meta": {"system_prompt": "be brief", "nested": {"list": [1, 2.5, None, True]}},
+        "cards": cards,
+        "history": {"source": "chat-1", "start": 3},
+    }
+
+
+def _parse(text, cuts):
+    parser = _ImportParser()
+    items = []
+    bounds = [0, *sorted(cuts), len(text)]
+    for start, end in zip(bounds, bounds[1:]):
+        items.extend(parser.feed(text[start:end]))
+    return parser, items
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_every_single_split(indent):
+    payload = _payload()
+    text = json.dumps(payload, indent=indent, ensure_ascii=False)
+    for cut in range(len(text) + 1):
+        parser, items = _parse(text, [cut])
+        assert parser.complete, cut
+        assert items == payload["cards"], cut
+        assert parser.meta == payload["meta"]
+        assert parser.history == payload["history"]
+
+
+def test_random_slices():
+    payload = _payload()
+    text = json.dumps(payload)
+    rng = random.Random(7)
+    for _ in range(200):
+        cuts = rng.sample(range(len(text)), rng.randint(1, 40))
+        parser, items = _parse(text, cuts)
+        assert parser.complete
+        assert items == payload["cards"]
+
+
+def test_one_character_at_a_time_bare_list():
+    cards = _payload()["cards"]
+    text = json.dumps(cards)
+    parser, items = _parse(text, range(1, len(text)))
+    assert parser.complete
+    assert items == cards
+    assert parser.meta is None
+
+
+def test_truncated_payload_is_incomplete():
+    text = json.dumps(_payload())
+    parser, items = _parse(text[:-1], [len(text) // 2])
+    assert not parser.complete
+    assert len(items) == len(_payload()["cards"])
+
+
+def test_rejects_non_container():
+    with pytest.raises(ValueError):
+        _ImportParser().feed('"cards"')
@@ -0,0 +1,91 @@
+"""Tests for the per-connection send queue in `pylogue.core`."""
+
+import asyncio
+
+from pylogue.core import _SessionOutbox, get_metrics
+
+
+class _Socket:
+    """Fake send/close pair; `stalled` holds every send until released."""
+
+    def __init__(self, stalled: bool = False):
+        self.sent = []
+        self.closed_with = []
+        self.release = asyncio.Event()
+        if not stalled:
+            self.release.set()
+
+    async def send(self, message):
+        await self.release.wait()
+        self.sent.append(message)
+
+    async def close(self, code=None):
+        self.closed_with.append(code)
+
+
+def test_frames_go_out_in_order():
+    async def run():
+        sock = _Socket()
+        outbox = _SessionOutbox(sock.send, close=sock.close, max_size=4)
+        for i in range(10):
+            outbox.put(f"frame {i}")
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        return sock
+
+    sock = asyncio.run(run())
+    assert sock.sent == [f"frame {i}" for i in range(10)]
+    assert sock.closed_with == []
+
+
+def test_full_queue_collapses_keyed_updates():
+    async def run():
+        sock = _Socket(stalled=True)
+        outbox = _SessionOutbox(sock.send, close=sock.close, max_size=3)
+        outbox.put("question")
+        await asyncio.sleep(0)  # the writer takes "question" and stalls sending it
+        for i in range(10):
+            outbox.put(f"delta {i}", key="card-1", snapshot=lambda: "snapshot")
+        sock.release.set()
+        await asyncio.sleep(0.01)
+        return sock
+
+    before = get_metrics()["collapsed_updates"]
+    sock = asyncio.run(run())
+    # A full queue drops the queued deltas for the key and sends one snapshot in their place.
+    assert sock.sent[0] == "question"
+    assert "snapshot" in sock.sent
+    assert len(sock.sent) < 11
+    assert sock.closed_with == []
+    assert get_metrics()["collapsed_updates"] > before
+
+
+def test_full_queue_of_unkeyed_frames_closes_the_socket():
+    async def run():
+        sock = _Socket(stalled=True)
+        outbox = _SessionOutbox(sock.send, close=sock.close, max_size=3)
+        for i in range(50):
+            outbox.put(f"frame {i}")
+        queued = len(outbox._items)
+        await asyncio.sleep(0.01)
+        return sock, outbox, queued
+
+    before = get_metrics()["slow_client_disconnects"]
+    sock, outbox, queued = asyncio.run(run())
+    assert queued == 0
+    assert outbox.closed
+    assert sock.closed_with == [1013]
+    assert get_metrics()["slow_client_disconnects"] - before == 1
+
+
+def test_send_timeout_closes_the_socket():
+    async def run():
+        sock = _Socket(stalled=True)
+        outbox = _SessionOutbox(sock.send, close=sock.close, send_timeout=0.01)
+        outbox.put("frame")
+        await asyncio.sleep(0.05)
+        return sock, outbox
+
+    sock, outbox = asyncio.run(run())
+    assert outbox.closed
+    assert sock.closed_with == [1013]
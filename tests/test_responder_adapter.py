@@ -0,0 +1,106 @@
+"""Tests for the cached responder calling conventions in `pylogue.core`."""
+
+import asyncio
+import functools
+
+from pylogue.core import _RESPONDER_ADAPTERS, _responder_adapter
+
+
+def _call(responder, prompt="hi", context="ctx"):
+    result = _responder_adapter(responder)(responder, prompt, context)
+    if asyncio.iscoroutine(result):
+        return asyncio.run(result)
+    if hasattr(result, "__aiter__"):
+
+        async def collect():
+            return [chunk async for chunk in result]
+
+        return asyncio.run(collect())
+    return result
+
+
+def test_sync_function_without_context():
+    def respond(message):
+        return f"echo {message}"
+
+    adapter = _responder_adapter(respond)
+    assert (adapter.kind, adapter.context) == ("sync", None)
+    assert _call(respond) == "echo hi"
+
+
+def test_optional_second_parameter_is_not_a_context_slot():
+    def respond(message, temperature=0.7):
+        return (message, temperature)
+
+    assert _responder_adapter(respond).context is None
+    assert _call(respond) == ("hi", 0.7)
+
+
+def test_positional_context():
+    def respond(message, ctx):
+        return (message, ctx)
+
+    assert _responder_adapter(respond).context == "positional"
+    assert _call(respond) == ("hi", "ctx")
+
+
+def test_coroutine_with_context_keyword():
+    async def respond(message, context=None):
+        return (message, context)
+
+    adapter = _responder_adapter(respond)
+    assert (adapter.kind, adapter.context) == ("coroutine", "keyword")
+    assert _call(respond) == ("hi", "ctx")
+
+
+def test_async_generator_with_var_keyword():
+    async def respond(message, **kwargs):
+        yield message
+        yield kwargs["context"]
+
+    adapter = _responder_adapter(respond)
+    assert (adapter.kind, adapter.context) == ("asyncgen", "keyword")
+    assert _call(respond) == ["hi", "ctx"]
+
+
+def test_class_responders_share_one_adapter_per_class():
+    class Responder:
+        async def __call__(self, message, context=None):
+            return (message, context)
+
+    first, second = Responder(), Responder()
+    assert _responder_adapter(first) is _responder_adapter(second)
+    assert _RESPONDER_ADAPTERS[Responder] is _responder_adapter(first)
+    assert _call(first) == ("hi", "ctx")
+
+
+def test_bound_method_and_partial():
+    class Bot:
+        def reply(self, message, context):
+            return (message, context)
+
+    assert _call(Bot().reply) == ("hi", "ctx")
+    partial = functools.partial(lambda prefix, message: prefix + message, "> ")
+    assert _call(partial) == "> hi"
+
+
+def test_distinct_callables_do_not_share_adapters():
+    # Functions built by one factory share a name and a class, but each keeps its own adapter.
+    def make(with_context):
+        if with_context:
+
+            def respond(message, context):
+                return context
+
+        else:
+
+            def respond(message):
+                return message
+
+        return respond
+
+    plain, contextual = make(False), make(True)
+    assert _call(plain) == "hi"
+    assert _call(contextual) == "ctx"
+    assert _call(plain) == "hi"
+    assert _responder_adapter(plain) is not _responder_adapter(contextual)
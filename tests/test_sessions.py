@@ -0,0 +1,93 @@
+"""Tests for the `pylogue.sessions` stores."""
+
+import pytest
+
+from pylogue.sessions import InMemorySessionStore, RedisSessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    if request.param == "sqlite":
+        return SQLiteSessionStore(tmp_path / "sessions.db")
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisSessionStore(fakeredis.FakeRedis())
+
+
+def _payload():
+    return {
+        "cards": [
+            {"id": "0", "question": "hi", "answer": "hello", "answer_text": "hello"},
+            {"id": "1", "question": "more", "answer": ""},
+        ],
+        "meta": {"system_prompt": "be brief"},
+        "owner": "a@example.com",
+    }
+
+
+def test_round_trip(store):
+    store.put("s1", _payload())
+    assert store.get("s1") == _payload()
+    assert store.get("missing") is None
+
+
+def test_append_chunk_folds_into_card(store):
+    store.put("s1", _payload())
+    store.append_chunk("s1", "1", "par")
+    store.append_chunk("s1", "1", "tial")
+    cards = store.get("s1")["cards"]
+    assert cards[1]["answer"] == "partial"
+    assert cards[0]["answer"] == "hello"
+
+
+def test_put_drops_chunks(store):
+    store.put("s1", _payload())
+    store.append_chunk("s1", "1", "stale")
+    store.put("s1", _payload())
+    assert store.get("s1")["cards"][1]["answer"] == ""
+
+
+def test_put_card_replaces_and_appends(store):
+    store.put("s1", _payload())
+    store.append_chunk("s1", "1", "streamed")
+    store.append_chunk("s1", "0", " again")
+    finished = {"id": "1", "question": "more", "answer": "done", "answer_text": "done"}
+    assert store.put_card("s1", finished, {"stream": {"id": "x", "done": True}, "owner": None})
+    assert store.put_card("s1", {"id": "2", "question": "new", "answer": ""})
+    data = store.get("s1")
+    assert [card["id"] for card in data["cards"]] == ["0", "1", "2"]
+    # Chunks of the rewritten card are dropped; other cards keep theirs.
+    assert data["cards"][1]["answer"] == "done"
+    assert data["cards"][0]["answer"] == "hello again"
+    assert data["stream"] == {"id": "x", "done": True}
+    assert data["meta"] == {"system_prompt": "be brief"}
+    assert "owner" not in data
+
+
+def test_put_card_needs_stored_session(store):
+    assert store.put_card("missing", {"id": "0", "question": "q", "answer": "a"}) is False
+    assert store.get("missing") is None
+
+
+def test_expire(store):
+    store.put("s1", _payload())
+    store.put("s2", _payload())
+    store.append_chunk("s1", "1", "x")
+    store.expire("s1", 0)
+    assert store.get("s1") is None
+    assert store.put_card("s1", {"id": "0", "question": "q", "answer": "a"}) is False
+    store.expire("s2", 60)
+    assert store.get("s2") == _payload()
+
+
+def test_in_memory_store_is_bounded():
+    store = InMemorySessionStore(max_entries=2)
+    for session_id in ("a", "b", "c"):
+        store.put(session_id, _payload())
+    assert store.get("a") is None
+    # A card write counts as recent use, so "b" outlives "c".
+    store.put_card("b", {"id": "0", "question": "q", "answer": "a"})
+    store.put("d", _payload())
+    assert store.get("b") is not None
+    assert store.get("c") is None
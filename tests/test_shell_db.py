@@ -0,0 +1,71 @@
+"""Tests for the chat history database in `pylogue.shell`."""
+
+import json
+import sqlite3
+
+import sqlalchemy as sa
+
+from pylogue.shell import Chat, _chat_cards, _get_chat, _store_card, migrate_chat_db, open_chat_db
+
+
+def _legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE chat (id TEXT PRIMARY KEY, title TEXT, created_at TEXT, updated_at TEXT, payload TEXT)")
+    payload = {
+        "cards": [
+            {"id": "0", "question": "hi", "answer": "hello", "answer_text": "hello", "rating": 5},
+            {"id": "1", "question": "more", "answer": "sure", "answer_text": "sure"},
+        ],
+        "meta": {"system_prompt": "be brief"},
+    }
+    roles = [{"role": "User", "content": "q"}, {"role": "Assistant", "content": "a"}]
+    conn.executemany(
+        "INSERT INTO chat VALUES (?, ?, ?, ?, ?)",
+        [
+            ("c1", "First", "2024-01-01", "2024-01-02", json.dumps(payload)),
+            ("c2", None, "2024-02-01", None, json.dumps(roles)),
+            ("c3", "Empty", "2024-03-01", "2024-03-01", ""),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return payload
+
+
+def test_migrate_chat_db(tmp_path):
+    path = tmp_path / "chat_app.db"
+    payload = _legacy_db(path)
+    database = open_chat_db(path)
+
+    assert "chat" not in sa.inspect(database.conn).get_table_names()
+    first = _get_chat(database, "c1")
+    assert (first.title, first.created_at, first.updated_at) == ("First", "2024-01-01", "2024-01-02")
+    assert first.card_count == 2
+    assert json.loads(first.meta) == payload["meta"]
+    assert _chat_cards(database, "c1") == payload["cards"]
+
+    second = _get_chat(database, "c2")
+    assert (second.title, second.updated_at, second.meta) == ("New chat", "2024-02-01", "")
+    assert [(c["question"], c["answer"]) for c in _chat_cards(database, "c2")] == [("q", "a")]
+    assert _get_chat(database, "c3").card_count == 0
+
+    # Already migrated: nothing left to move.
+    assert migrate_chat_db(database) == 0
+
+
+def test_migrate_skips_new_databases(tmp_path):
+    database = open_chat_db(tmp_path / "chat_app.db")
+    assert migrate_chat_db(database) == 0
+
+
+def test_store_card_appends_and_rewrites(tmp_path):
+    database = open_chat_db(tmp_path / "chat_app.db")
+    chat = Chat("c", "New chat", "t0", "t0")
+    _store_card(database, chat, 0, {"id": "0", "question": "q0", "answer": "a0"})
+    _store_card(database, chat, 1, {"id": "1", "question": "q1", "answer": "partial"})
+    _store_card(database, chat, 1, {"id": "1", "question": "q1", "answer": "a1", "answer_text": "a1"})
+    assert _get_chat(database, "c").card_count == 2
+    assert _chat_cards(database, "c") == [
+        {"id": "0", "question": "q0", "answer": "a0", "answer_text": ""},
+        {"id": "1", "question": "q1", "answer": "a1", "answer_text": "a1"},
+    ]